@@ -0,0 +1,182 @@
+import os
+import time
+import queue
+import threading
+from recommender.utils.metrics import timed
+from recommender.utils.pipeline import RetryPolicy
+
+# Firestore accepts at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+
+class WriteQueueFull(RuntimeError):
+    """
+    Raised when too many documents are already waiting to be written.
+    """
+
+
+class BatchWriter:
+    """
+    Write-behind buffer of new documents for one Firestore collection.
+
+    add() assigns the document id on the client and returns right away. A writer thread commits the
+    waiting documents in batches of up to `max_batch`, at most `max_wait` seconds after the first of
+    them arrived. At most `max_pending` documents wait at once; beyond that add() blocks for up to
+    `put_timeout` seconds and then raises WriteQueueFull. A failed commit is retried according to
+    `retry`, after which its documents are dropped and logged. close() (registered with atexit by
+    the app) writes what is left before the process exits.
+
+    The writer thread starts on the first add() of each process, so a writer created before a
+    preforking server forks (gunicorn's preload_app) works in every worker.
+    """
+
+    def __init__(self, get_db, collection: str, max_batch: int = 100, max_wait: float = 0.5,
+                 max_pending: int = 10000, put_timeout: float = 1.0,
+                 retry: RetryPolicy = RetryPolicy(attempts=3, retry_on=(Exception,), backoff=0.5)):
+        """
+        Args:
+            get_db (callable): get_db() -> firestore.Client, called on the first write.
+            collection (str): collection to add the documents to.
+            max_batch (int): most documents per batch commit, at most 500.
+            max_wait (float): seconds to wait for more documents before committing a batch.
+            max_pending (int): most documents waiting to be written.
+            put_timeout (float): seconds add() waits for room in the queue.
+            retry (RetryPolicy): retries of a failed batch commit.
+        """
+        if not 1 <= max_batch <= MAX_BATCH_WRITES:
+            raise ValueError(f"max_batch must be between 1 and {MAX_BATCH_WRITES}")
+        self.get_db = get_db
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.put_timeout = put_timeout
+        self.retry = retry
+        self.max_pending = max_pending
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # fresh state for this process; a forked child inherits the parent's, but not its thread,
+        # and its locks may have been held at the fork
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._unfinished = 0
+        self._done = threading.Condition()
+        self._closed = False
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"{self.collection}-writer", daemon=True)
+                self._worker.start()
+
+    def add(self, document: dict) -> str:
+        """
+        Queues a new document.
+
+        Args:
+            document (dict): the document fields.
+
+        Returns:
+            str: the id the document will be written under.
+        """
+        self._ensure_worker()
+        if self._closed:
+            raise RuntimeError("The writer is closed")
+        ref = self.get_db().collection(self.collection).document()
+        with self._done:
+            self._unfinished += 1
+        try:
+            self._queue.put((ref, document), timeout=self.put_timeout)
+        except queue.Full:
+            self._finish(1)
+            raise WriteQueueFull(f"Write queue is full ({self.max_pending} documents pending)")
+        return ref.id
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, writes):
+        for attempt in range(1, self.retry.attempts + 1):
+            try:
+                batch = self.get_db().batch()
+                for ref, document in writes:
+                    batch.set(ref, document)
+                with timed("firestore_commit"):
+                    batch.commit()
+                return True
+            except self.retry.retry_on as e:
+                if attempt == self.retry.attempts:
+                    print(f"Error writing {len(writes)} documents to {self.collection}, dropping them: {e}")
+                    return False
+                delay = self.retry.delay(attempt)
+                print(f"Error writing {len(writes)} documents to {self.collection} ({e}). Retrying in {delay:.2f}s...")
+                time.sleep(delay)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1] is None
+            writes = [write for write in batch if write is not None]
+            if writes:
+                if self._commit(writes):
+                    self.written += len(writes)
+                else:
+                    self.failed += len(writes)
+                self._finish(len(writes))
+            if stop:
+                return
+
+    def _finish(self, count: int):
+        with self._done:
+            self._unfinished -= count
+            self._done.notify_all()
+
+    def pending(self) -> int:
+        """
+        Number of documents queued or being written.
+        """
+        with self._done:
+            return self._unfinished
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until every document added so far is written (or dropped).
+
+        Returns:
+            bool: False if `timeout` seconds passed first.
+        """
+        with self._done:
+            return self._done.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def close(self, timeout: float = 30.0):
+        """
+        Stops accepting documents, writes the waiting ones and stops the writer thread.
+        """
+        if self._worker is None:
+            # nothing was added in this process
+            self._closed = True
+            return
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            print(f"{self.pending()} documents were not written to {self.collection} before shutdown")
@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching in front of the localization model.
+
+    Concurrent requests call the batcher like the model with a single preprocessed image. A worker
+    thread takes the first waiting image, keeps collecting more for up to `max_wait_ms` or until
+    `max_batch` images are waiting, runs one batched forward pass and hands each caller its own
+    row of the outputs. Under load one pass serves many requests; an idle server only adds
+    `max_wait_ms` of latency.
+    """
+
+    def __init__(self, predict_batch, max_batch: int = 8, max_wait_ms: float = 5.0, timeout: float = 30.0):
+        """
+        Args:
+            predict_batch (callable): runs a (n, 244, 244, 1) batch and returns a list of output arrays
+                with n rows each, e.g. LocalizerRunner.predict_batch.
+            max_batch (int): largest batch to run.
+            max_wait_ms (float): how long to wait for more images once the first one arrives.
+            timeout (float): seconds a caller waits for its result before giving up.
+        """
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="localizer-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, X) -> Future:
+        """
+        Queues one image of shape (1, 244, 244, 1).
+
+        Returns:
+            Future: resolves to the model outputs for the image, each with a batch dimension of 1.
+        """
+        future = Future()
+        # copied, as callers may reuse their input buffer (see preprocess)
+        self._queue.put((np.array(X, dtype=np.float32), future))
+        return future
+
+    def __call__(self, X):
+        return self.submit(X).result(timeout=self.timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = [item for item in self._collect() if item is not None]
+            batch = [(X, future) for X, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                outputs = self.predict_batch(np.concatenate([X for X, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for i, (_, future) in enumerate(batch):
+                future.set_result([output[i:i + 1] for output in outputs])
+
+    def qsize(self) -> int:
+        """
+        Number of images waiting for a forward pass.
+        """
+        return self._queue.qsize()
+
+    def stop(self):
+        """
+        Stops the worker thread once the images already collected have run.
+        """
+        self._stop.set()
+        self._queue.put(None)
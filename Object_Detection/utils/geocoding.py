@@ -0,0 +1,125 @@
+import re
+import threading
+import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from Object_Detection.utils.result_cache import ResultCache
+from Object_Detection.utils.vertex_extract_dict import geocode_address
+from recommender.utils.metrics import cache_lookup
+
+
+def normalize_address(address: str) -> str:
+    """
+    Lowercases an address and reduces punctuation and whitespace to single spaces, so OCR variants
+    of the same store address ("PT.SUMBER ALFARIA; TBK" and "PT. SUMBER ALFARIA TBK") match.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", address.lower()).split())
+
+
+def geocoding_session(pool_size: int = 10) -> requests.Session:
+    """
+    A requests.Session keeping up to `pool_size` connections to the Geocoding API alive.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class Gazetteer:
+    """
+    Normalized store address -> (lat, lng) lookup in front of the Geocoding API.
+
+    Seeded with the addresses and coordinates already in the purchase history, and kept up to date
+    as receipts are appended (it is a derived structure of PurchaseHistoryStore). Addresses not
+    found locally are geocoded over a pooled session and remembered; failed lookups are remembered
+    for `failure_ttl` seconds so unreadable addresses are not retried on every upload. With `path`,
+    the entries persist in a SQLite file.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = 100000, failure_ttl: float = 3600,
+                 session: requests.Session = None, geocode=None):
+        # geocode(address, credentials) -> (lat, lng) replaces the Geocoding API call, e.g. with a
+        # local stand-in in offline tests; credentials is the callable passed to geocode()
+        self.failure_ttl = failure_ttl
+        self._cache = ResultCache(max_entries=max_entries, path=path)
+        self._session = session
+        self._geocode = geocode
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs):
+        """
+        Builds a gazetteer seeded from a purchase_history frame.
+        """
+        gazetteer = cls(**kwargs)
+        gazetteer.extend(df, 0)
+        return gazetteer
+
+    def extend(self, rows: pd.DataFrame, start: int = 0):
+        """
+        Adds the geocoded purchase addresses of new purchase rows.
+
+        Args:
+            rows (pd.DataFrame): rows with purchase_address, long and lat columns.
+            start (int): row position of the first of `rows`, unused but part of the store's derived
+                structure interface.
+        """
+        rows = rows[rows['purchase_address'].notna() & rows['long'].notna() & rows['lat'].notna()]
+        locations = {}
+        for address, lon, lat in zip(rows['purchase_address'], rows['long'], rows['lat']):
+            key = normalize_address(str(address))
+            if key and key not in locations:
+                locations[key] = (float(lat), float(lon))
+        self._cache.put_many(locations)
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                self._session = geocoding_session()
+            return self._session
+
+    def lookup(self, address: str):
+        """
+        Returns:
+            tuple(float, float) | None: the known (lat, lng) of the address, (None, None) if it
+                recently failed to geocode, or None if it is unknown.
+        """
+        return self._cache.get(normalize_address(address))
+
+    def geocode(self, address: str, credentials):
+        """
+        Geocodes an address, only calling the Geocoding API when it is not known yet.
+
+        Args:
+            address (str): The address to be geocoded.
+            credentials (callable): credentials() -> google.oauth2.credentials.Credentials with a valid
+                token. Only called when the address is not known, so lookups of known stores need
+                no key file and no token refresh.
+
+        Returns:
+            tuple(float, float) or None, None: the latitude and longitude, or None, None if geocoding fails.
+        """
+        key = normalize_address(address)
+        location = self._cache.get(key)
+        cache_lookup("geocode", location is not None)
+        if location is not None:
+            return location
+
+        if self._geocode is not None:
+            lat, lng = self._geocode(address, credentials)
+        else:
+            lat, lng = geocode_address(address, credentials(), session=self.session)
+        if lat is None or lng is None:
+            self._cache.put(key, (None, None), ttl=self.failure_ttl)
+        else:
+            self._cache.put(key, (lat, lng))
+        return lat, lng
+
+    def __contains__(self, address):
+        return self.lookup(address) is not None
+
+    def __len__(self):
+        return len(self._cache)
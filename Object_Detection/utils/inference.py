@@ -0,0 +1,166 @@
+import os
+import argparse
+import threading
+import numpy as np
+import tensorflow as tf
+
+INPUT_SIZE = 244
+INPUT_SHAPE = (1, INPUT_SIZE, INPUT_SIZE, 1)
+
+
+class LocalizerRunner:
+    """
+    Serving wrapper around the receipt localization Keras model.
+
+    Runs the model through a tf.function traced once for a fixed (1, 244, 244, 1) float32 input,
+    optionally XLA-compiled, instead of eager Keras calls. warmup() runs the tracing/compilation at
+    startup rather than inside the first user request. Instances are called like the model and
+    return its outputs as numpy arrays, so object_localization accepts either.
+
+    predict_batch() runs up to `max_batch` images in one forward pass for the MicroBatcher, through
+    a second function traced for a variable batch size.
+    """
+
+    def __init__(self, model, jit_compile: bool = False, max_batch: int = 1):
+        self.model = model
+        self.jit_compile = jit_compile
+        self.max_batch = max_batch
+        self._predict = tf.function(
+            lambda X: model(X, training=False),
+            input_signature=[tf.TensorSpec(INPUT_SHAPE, tf.float32)],
+            jit_compile=jit_compile,
+        )
+        self._predict_batch = tf.function(
+            lambda X: model(X, training=False),
+            input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE[1:], tf.float32)],
+            jit_compile=jit_compile,
+        )
+
+    def __call__(self, X):
+        outputs = self._predict(tf.convert_to_tensor(X, dtype=tf.float32))
+        return [output.numpy() for output in outputs]
+
+    def predict_batch(self, X):
+        """
+        Args:
+            X (numpy.ndarray): float32 images of shape (n, 244, 244, 1), n <= max_batch.
+
+        Returns:
+            list[numpy.ndarray]: the model outputs, each with n rows.
+        """
+        outputs = self._predict_batch(tf.convert_to_tensor(X, dtype=tf.float32))
+        return [output.numpy() for output in outputs]
+
+    def warmup(self, runs: int = 2):
+        """
+        Traces (and compiles) the inference functions with blank images. With XLA every batch size
+        up to max_batch is compiled separately, so all of them are warmed up.
+        """
+        X = np.zeros(INPUT_SHAPE, dtype=np.float32)
+        for _ in range(runs):
+            self(X)
+        if self.max_batch > 1:
+            sizes = range(1, self.max_batch + 1) if self.jit_compile else [self.max_batch]
+            for size in sizes:
+                self.predict_batch(np.zeros((size,) + INPUT_SHAPE[1:], dtype=np.float32))
+        return self
+
+    def export_saved_model(self, path: str):
+        """
+        Exports the model as a SavedModel with a `serve` signature for the fixed input shape,
+        taking `image` and returning `output_0`, `output_1`, ... in model output order.
+        """
+        archive = tf.keras.export.ExportArchive()
+        archive.track(self.model)
+        archive.add_endpoint(
+            name="serve",
+            fn=lambda image: self.model(image, training=False),
+            input_signature=[tf.TensorSpec(INPUT_SHAPE, tf.float32, name="image")],
+        )
+        archive.write_out(path)
+        return path
+
+    def export_tflite(self, path: str, saved_model_dir: str = None):
+        """
+        Converts the model to a TFLite flatbuffer for CPU serving with TFLiteLocalizer.
+        """
+        saved_model_dir = saved_model_dir or f"{os.path.splitext(path)[0]}_saved_model"
+        self.export_saved_model(saved_model_dir)
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir, signature_keys=["serve"])
+        with open(path, "wb") as f:
+            f.write(converter.convert())
+        return path
+
+
+class TFLiteLocalizer:
+    """
+    Runs a model exported with LocalizerRunner.export_tflite on the TFLite CPU interpreter, with
+    the same call interface as LocalizerRunner. The interpreter is not thread-safe, so calls are
+    serialized.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self._runner = self.interpreter.get_signature_runner("serve")
+        self._lock = threading.Lock()
+
+    def __call__(self, X):
+        with self._lock:
+            outputs = self._runner(image=np.asarray(X, dtype=np.float32))
+            return [np.copy(outputs[f"output_{i}"]) for i in range(len(outputs))]
+
+    def predict_batch(self, X):
+        """
+        The TFLite export has a fixed batch of one, so batches run image by image.
+        """
+        outputs = [self(X[i:i + 1]) for i in range(len(X))]
+        return [np.concatenate(output) for output in zip(*outputs)]
+
+    def warmup(self, runs: int = 2):
+        X = np.zeros(INPUT_SHAPE, dtype=np.float32)
+        for _ in range(runs):
+            self(X)
+        return self
+
+
+def load_localizer(model_path: str, backend: str = "keras", jit_compile: bool = False, warmup: bool = True,
+                   max_batch: int = 1):
+    """
+    Loads the localization model for serving.
+
+    Args:
+        model_path (str): Path to the .keras model, or to a .tflite export for the tflite backend.
+        backend (str): "keras" for the compiled Keras model, "tflite" for the TFLite interpreter.
+        jit_compile (bool): XLA-compile the Keras inference function.
+        warmup (bool): Run the model once before returning.
+        max_batch (int): Largest batch predict_batch() will be called with.
+
+    Returns:
+        LocalizerRunner | TFLiteLocalizer: a callable returning the model outputs as numpy arrays.
+    """
+    if backend == "tflite":
+        localizer = TFLiteLocalizer(model_path)
+    elif backend == "keras":
+        localizer = LocalizerRunner(tf.keras.models.load_model(model_path), jit_compile=jit_compile,
+                                    max_batch=max_batch)
+    else:
+        raise ValueError(f"Unknown localizer backend: {backend}")
+    return localizer.warmup() if warmup else localizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the receipt localization model for serving.")
+    parser.add_argument("model_path", help="path to the .keras model")
+    parser.add_argument("--saved-model", help="directory to write a SavedModel to")
+    parser.add_argument("--tflite", help="path to write a .tflite model to")
+    args = parser.parse_args()
+
+    runner = LocalizerRunner(tf.keras.models.load_model(args.model_path))
+    if args.saved_model:
+        print(f"SavedModel written to {runner.export_saved_model(args.saved_model)}")
+    if args.tflite:
+        print(f"TFLite model written to {runner.export_tflite(args.tflite)}")
+
+
+if __name__ == "__main__":
+    main()
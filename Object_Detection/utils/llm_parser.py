@@ -0,0 +1,73 @@
+import io
+import re
+import ast
+import json
+import tokenize
+
+# bare JSON literals -> their Python spelling, for ast.literal_eval
+_LITERALS = {"true": "True", "false": "False", "null": "None"}
+_VALUE_END = {tokenize.STRING, tokenize.NUMBER}
+_CLOSERS = {"]", "}", ")"}
+
+
+class LLMOutputError(ValueError):
+    """
+    Raised when a model response does not contain a dictionary that can be parsed.
+    """
+
+
+def _python_literal(text: str) -> str:
+    """
+    Rewrites dict-style model output into a Python literal: drops comments, spells JSON literals
+    the Python way and inserts the commas models tend to leave out between entries, e.g.
+    `"a": [] "b": []` on separate lines. Single quotes and trailing commas are valid Python already.
+    """
+    tokens = []
+    previous = None
+    for token in tokenize.generate_tokens(io.StringIO(text).readline):
+        kind, string = token.type, token.string
+        if kind in (tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT,
+                    tokenize.ENDMARKER):
+            continue
+        if kind == tokenize.NAME and string in _LITERALS:
+            string = _LITERALS[string]
+        if previous is not None and (kind in _VALUE_END or string in ("{", "[")):
+            previous_kind, previous_string = previous
+            if previous_kind in _VALUE_END or previous_string in _CLOSERS or previous_string in _LITERALS.values():
+                if not (kind == tokenize.STRING and previous_kind == tokenize.STRING):
+                    tokens.append(",")
+        tokens.append(string)
+        previous = (kind, string)
+    return " ".join(tokens)
+
+
+def parse_llm_dict(text: str) -> dict:
+    """
+    Parses the dictionary in a model response, in memory.
+
+    Takes the outermost {...} of the response and reads it as JSON, or failing that as a Python
+    dict literal, which tolerates single quotes, trailing commas, # comments, True/False/None and
+    missing commas between entries.
+
+    Args:
+        text (str): the model response.
+
+    Returns:
+        dict: the parsed dictionary.
+    """
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if match is None:
+        raise LLMOutputError("No dictionary found in the model response")
+    candidate = match.group(0)
+
+    try:
+        data = json.loads(candidate)
+    except ValueError:
+        try:
+            data = ast.literal_eval(_python_literal(candidate))
+        except (ValueError, SyntaxError, tokenize.TokenError, MemoryError, RecursionError) as e:
+            raise LLMOutputError(f"Could not parse the model response as a dictionary: {e}") from e
+
+    if not isinstance(data, dict):
+        raise LLMOutputError("The model response is not a dictionary")
+    return data
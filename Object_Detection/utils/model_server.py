@@ -0,0 +1,194 @@
+import os
+import time
+import argparse
+import threading
+from multiprocessing.connection import Listener, Client
+
+MODEL_PATH = "./Object_Detection/Saved_Models/model.keras"
+
+
+def authkey() -> bytes:
+    return os.getenv("LOCALIZER_AUTHKEY", "localizer").encode()
+
+
+class ModelServer:
+    """
+    Serves one localizer to many worker processes over a Unix socket.
+
+    TensorFlow cannot be used in a process forked after it has run, so a preforking server cannot
+    share one warmed-up model between its workers. Instead one model-server process loads the
+    model and the workers send it preprocessed images with RemoteLocalizer. With max_batch > 1
+    requests from all workers are micro-batched together.
+    """
+
+    def __init__(self, localizer, address: str):
+        self.localizer = localizer
+        self.address = address
+
+    def _handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if message[0] == "predict":
+                        reply = ("ok", self.localizer(message[1]))
+                    elif message[0] == "ping":
+                        reply = ("ok", None)
+                    else:
+                        reply = ("error", f"Unknown request: {message[0]}")
+                except Exception as e:
+                    reply = ("error", str(e))
+                connection.send(reply)
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, family="AF_UNIX", authkey=authkey()) as listener:
+            print(f"Localizer listening on {self.address}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"Error accepting localizer connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+
+class RemoteLocalizer:
+    """
+    Client of a ModelServer, called like the model (see object_localization).
+
+    Each thread keeps its own connection. Connecting waits up to `connect_timeout` seconds for the
+    server to come up, and a broken connection is reopened once per call.
+    """
+
+    def __init__(self, address: str, connect_timeout: float = 120.0):
+        self.address = address
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+
+    def _connect(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return Client(self.address, family="AF_UNIX", authkey=authkey())
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+
+    def _request(self, message, timeout: float = None):
+        timeout = self.connect_timeout if timeout is None else timeout
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = self._connect(timeout)
+            try:
+                connection.send(message)
+                status, payload = connection.recv()
+                break
+            except (EOFError, OSError):
+                self._local.connection = None
+                connection.close()
+                if attempt == 1:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Localizer error: {payload}")
+        return payload
+
+    def __call__(self, X):
+        return self._request(("predict", X))
+
+    def ready(self) -> bool:
+        """
+        Whether the model server is up and answering.
+        """
+        try:
+            self._request(("ping",), timeout=0)
+            return True
+        except (OSError, EOFError, RuntimeError):
+            return False
+
+
+class BackgroundLocalizer:
+    """
+    Loads a localizer on a background thread, so the app answers health checks while TensorFlow
+    and the model load. Called like the model; calls made during the load wait for it, for at most
+    `timeout` seconds.
+    """
+
+    def __init__(self, load, timeout: float = 300.0):
+        """
+        Args:
+            load (callable): load() -> localizer, e.g. a call to load_localizer.
+            timeout (float): seconds a call waits for the load to finish.
+        """
+        self.timeout = timeout
+        self.load_seconds = None
+        self._localizer = None
+        self._error = None
+        self._loaded = threading.Event()
+        threading.Thread(target=self._load, args=(load,), name="localizer-loader", daemon=True).start()
+
+    def _load(self, load):
+        start = time.perf_counter()
+        try:
+            self._localizer = load()
+            print(f"Model loaded and warmed up in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            self._error = e
+            print(f"Error loading the model: {e}")
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._loaded.set()
+
+    def get(self):
+        """
+        Returns:
+            the loaded localizer, waiting for it if needed.
+        """
+        if not self._loaded.wait(self.timeout):
+            raise TimeoutError("The model is still loading")
+        if self._error is not None:
+            raise RuntimeError(f"The model failed to load: {self._error}")
+        return self._localizer
+
+    def __call__(self, X):
+        return self.get()(X)
+
+    def ready(self) -> bool:
+        return self._loaded.is_set() and self._error is None
+
+
+def main():
+    from Object_Detection.utils.inference import load_localizer
+    from Object_Detection.utils.batching import MicroBatcher
+
+    parser = argparse.ArgumentParser(description="Serve the receipt localization model over a Unix socket.")
+    # defaults follow the LOCALIZER_* settings of app.py
+    backend = os.getenv("LOCALIZER_BACKEND", "keras")
+    model_path = (os.getenv("LOCALIZER_TFLITE_PATH", "./Object_Detection/Saved_Models/model.tflite")
+                  if backend == "tflite" else MODEL_PATH)
+    parser.add_argument("--socket", default=os.getenv("LOCALIZER_SOCKET", "/tmp/localizer.sock"))
+    parser.add_argument("--model", default=model_path, help="path to the .keras (or .tflite) model")
+    parser.add_argument("--backend", default=backend, choices=["keras", "tflite"])
+    parser.add_argument("--xla", action="store_true", default=os.getenv("LOCALIZER_XLA", "0") == "1",
+                        help="XLA-compile the Keras model")
+    parser.add_argument("--max-batch", type=int, default=int(os.getenv("LOCALIZER_MAX_BATCH", "1")))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("LOCALIZER_MAX_WAIT_MS", "5")))
+    args = parser.parse_args()
+    if not os.path.exists(args.model):
+        raise FileNotFoundError(f"Model file not found at {args.model}")
+
+    localizer = load_localizer(args.model, backend=args.backend, jit_compile=args.xla, max_batch=args.max_batch)
+    if args.max_batch > 1:
+        localizer = MicroBatcher(localizer.predict_batch, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print("Model loaded and warmed up successfully.")
+    ModelServer(localizer, args.socket).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,318 @@
-import tensorflow as tf #tensorflow ver 2.18.0
+import os
+import mmap
+import threading
 import numpy as np
 import cv2 as cv
 import pytesseract
+from Object_Detection.utils.result_cache import image_digest
+from recommender.utils.metrics import timed, cache_lookup
 
-from matplotlib import pyplot as plt
+# libjpeg decodes straight to 1/2, 1/4 or 1/8 scale (other formats are decoded, then resized)
+REDUCED_GRAYSCALE = {2: cv.IMREAD_REDUCED_GRAYSCALE_2, 4: cv.IMREAD_REDUCED_GRAYSCALE_4, 8: cv.IMREAD_REDUCED_GRAYSCALE_8}
+# start-of-frame markers, which hold the image size (0xC4, 0xC8 and 0xCC are other segments)
+# the crop is decoded at reduced scale as long as the receipt stays at least this many pixels wide,
+# about 20 px per character on a 48-column receipt, which tesseract still reads reliably
+OCR_MIN_CROP_WIDTH = 1000
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
 
-def object_localization(img_path, model):
+# per-thread model input buffers, see preprocess
+_buffers = threading.local()
+
+def read_image(source, flags=cv.IMREAD_COLOR):
     """
-    Localizes the object of interest (receipt) in an image.
+    Loads an image from a path, or decodes it straight from memory.
 
     Args:
-        img_path (str): Path to the image file.
-        model (tf.keras.Model): The object detection model.
+        source (str | bytes | numpy.ndarray): Path to the image file, the encoded file contents
+            (bytes or a 1-D uint8 buffer), or an already decoded image.
+        flags (int): cv.imread/cv.imdecode flags.
 
     Returns:
-        numpy.ndarray: The cropped image containing the localized object.
+        numpy.ndarray: The decoded image.
     """
-    
-    # MAIN CODE #
-    input_size = 244
+    if isinstance(source, (str, os.PathLike)):
+        img = cv.imread(os.fspath(source), flags)
+    elif isinstance(source, np.ndarray) and source.ndim > 1:
+        return source
+    else:
+        img = cv.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+
+    if img is None:
+        raise ValueError("Could not read the image. Please upload a valid jpg or png file.")
+    return img
+
+def header_size(data):
+    """
+    Reads the size of a JPEG or PNG image from its header, without decoding it.
+
+    Args:
+        data (bytes | memoryview | mmap.mmap): The encoded file contents.
+
+    Returns:
+        tuple(int, int) | None: (width, height), or None for other formats and malformed headers.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    # walk the JPEG segments up to the frame header
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0xD9, 0xDA):  # end of image or start of scan before any frame header
+            return None
+        if marker in SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            return int.from_bytes(data[i + 7:i + 9], "big"), int.from_bytes(data[i + 5:i + 7], "big")
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+def image_size(source):
+    """
+    Size of an image, read from the file header when it is not decoded yet.
+
+    Args:
+        source (str | bytes | numpy.ndarray): Path to the image file, its contents, or a decoded image.
+
+    Returns:
+        tuple(int, int) | None: (width, height), or None if the header could not be read.
+    """
+    if isinstance(source, np.ndarray) and source.ndim > 1:
+        return source.shape[1], source.shape[0]
+    if not isinstance(source, (str, os.PathLike)):
+        return header_size(memoryview(source).cast("B"))
+    try:
+        with open(os.fspath(source), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return header_size(data)
+    except (OSError, ValueError):
+        return None
 
-    # Load the image
-    img = cv.imread(img_path)  
+def reduction_factor(size, input_size=244):
+    """
+    Largest decode scale-down (1, 2, 4 or 8) that keeps the longest side at least input_size.
 
-    # Convert to RGB if not grayscale
+    Args:
+        size (tuple(int, int)): (width, height) of the full-resolution image.
+        input_size (int): Side of the square model input.
+
+    Returns:
+        int: The factor.
+    """
+    longest = max(size)
+    for factor in (8, 4, 2):
+        if longest // factor >= input_size:
+            return factor
+    return 1
+
+def to_grayscale(img):
     if len(img.shape) == 3:  # Check if image has 3 channels (color)
-        img = cv.cvtColor(img, cv.COLOR_BGR2GRAY)  # Convert to grayscale
+        return cv.cvtColor(img, cv.COLOR_BGR2GRAY)  # Convert to grayscale
+    return img
+
+def read_detector_image(source, input_size=244):
+    """
+    Decodes an image for the detector only: in grayscale, and at the lowest resolution that still
+    fills the model input, so a 12 MP photo is decoded into a fraction of its pixels.
+
+    Args:
+        source (str | bytes | numpy.ndarray): Path to the image file, its contents, or a decoded image.
+        input_size (int): Side of the square model input.
+
+    Returns:
+        tuple(numpy.ndarray, int): The grayscale image, and the longest side of the full-resolution image.
+    """
+    if isinstance(source, np.ndarray) and source.ndim > 1:
+        img = to_grayscale(source)
+        return img, max(img.shape)
+
+    size = image_size(source)
+    factor = reduction_factor(size, input_size) if size is not None else 1
+    img = read_image(source, REDUCED_GRAYSCALE[factor] if factor > 1 else cv.IMREAD_GRAYSCALE)
+    # the header size is the unrotated one, but only its longest side is used
+    return img, max(size) if size is not None else max(img.shape)
 
-    #preprocess the image
+def read_crop(source, box, min_width=OCR_MIN_CROP_WIDTH):
+    """
+    Grayscale pixels of a box of an image, decoded at the lowest resolution that keeps the box at
+    least `min_width` pixels wide.
+
+    OpenCV cannot decode only a region of an image, so the whole frame is decoded, but a JPEG is
+    decoded straight at 1/2, 1/4 or 1/8 scale when the receipt is wide enough in the photo. Only a
+    narrow receipt needs the full-resolution frame.
+
+    Args:
+        source (str | bytes | numpy.ndarray): Path to the image file, its contents, or a decoded image.
+        box (numpy.ndarray): [x_min, y_min, x_max, y_max] in full-resolution pixels.
+        min_width (int): Narrowest crop to decode, in pixels.
+
+    Returns:
+        numpy.ndarray: The crop, as a copy so the decoded frame is freed.
+    """
+    x_min, y_min, x_max, y_max = (int(v) for v in box)
+    if isinstance(source, np.ndarray) and source.ndim > 1:
+        return to_grayscale(source)[y_min:y_max, x_min:x_max].copy()
+
+    factor = 1
+    for candidate in (8, 4, 2):
+        if (x_max - x_min) // candidate >= min_width:
+            factor = candidate
+            break
+    img = read_image(source, REDUCED_GRAYSCALE[factor] if factor > 1 else cv.IMREAD_GRAYSCALE)
+    return img[y_min // factor:y_max // factor, x_min // factor:x_max // factor].copy()
+
+def _buffer(name, shape, dtype):
+    buffer = getattr(_buffers, name, None)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, dtype=dtype)
+        setattr(_buffers, name, buffer)
+    return buffer
+
+def preprocess(img, input_size=244):
+    """
+    Letterboxes a grayscale image into the model input.
+
+    Args:
+        img (numpy.ndarray): Grayscale image.
+        input_size (int): Side of the square model input.
+
+    Returns:
+        tuple(numpy.ndarray, int): float32 batch of shape (1, input_size, input_size, 1) scaled to [0, 1],
+            and the longest side of the original image. The batch is a per-thread buffer that the
+            next call on the same thread overwrites.
+    """
     height, width = img.shape
     max_size = max(height, width)
     r = max_size / input_size
     new_width = int(width / r)
     new_height = int(height / r)
     new_size = (new_width, new_height)
-    resized = cv.resize(img, new_size, interpolation= cv.INTER_LINEAR)
-    new_image = np.zeros((input_size, input_size), dtype=np.uint8)
-    new_image[0:new_height, 0:new_width] = resized
+    new_image = _buffer("image", (input_size, input_size), np.uint8)
+    new_image.fill(0)
+    cv.resize(img, new_size, dst=new_image[0:new_height, 0:new_width], interpolation= cv.INTER_LINEAR)
 
-    #second preprocessing
-    X = [] 
-    new_image = new_image.astype(float) / 255.
+    #second and third preprocessing, in place
+    X = _buffer("batch", (1, input_size, input_size, 1), np.float32)
+    np.divide(new_image, np.float32(255.), out=X[0, :, :, 0])
 
-    X.append(new_image)
+    return X, max_size
 
-    #third preprocessing
-    X = np.array(X)
-    
-    X = np.expand_dims(X, axis=3)
+def box_from_predictions(predictions, max_size):
+    """
+    Scales the predicted box of the first image in a batch back to original image pixels.
 
-    X = tf.convert_to_tensor(X, dtype=tf.float32)
+    Args:
+        predictions: Model outputs, the second of which holds the boxes (tensors or arrays).
+        max_size (int): Longest side of the original image.
 
-    result = X
-    
-    # Object Localization for 
-    predictions = model(result) #change
+    Returns:
+        numpy.ndarray: int32 [x_min, y_min, x_max, y_max].
+    """
+    predicted_box = np.abs(np.asarray(predictions[1][0], dtype=np.float32))
+    norm_max = predicted_box.max()
 
-    predicted_box = abs(predictions[1][0] * max_size)
-    
-    predicted_box = tf.cast(predicted_box, tf.int32)
+    predicted_box = (predicted_box / norm_max) * max_size
 
-    predicted_box = abs(predictions[1][0])
-    norm_max = max(predicted_box)
-    norm_max = norm_max.numpy()
+    return predicted_box.astype(np.int32)
 
-    predicted_box = (predicted_box / norm_max) * max_size
-    
-    predicted_box = tf.cast(predicted_box, tf.int32)
-    predicted_box_value = predicted_box.numpy()
+def object_localization(img_path, model, cache=None, digest=None):
+    """
+    Localizes the object of interest (receipt) in an image.
+
+    Args:
+        img_path (str | bytes | numpy.ndarray): Path to the image file, its contents, or a decoded image.
+        model (tf.keras.Model | LocalizerRunner | MicroBatcher): The object detection model, or a serving wrapper around it.
+        cache (ResultCache): Optional cache of predicted boxes, keyed on the image's hash.
+        digest (str): image_digest of img_path, if already computed.
+
+    Returns:
+        numpy.ndarray: The cropped image containing the localized object.
+    """
     
-    x_min,y_min,x_max,y_max = predicted_box_value
-    cropped_struk = img[y_min:y_max, x_min:x_max]
-    cropped_struk = np.array(cropped_struk)
+    # MAIN CODE #
+    input_size = 244
+
+    box = None
+    if cache is not None:
+        box_key = f"box:{digest or image_digest(img_path)}"
+        box = cache.get(box_key)
+        cache_lookup("box", box is not None)
+
+    if box is None:
+        # Load the image at reduced resolution; the crop is decoded again at the resolution OCR needs
+        with timed("decode"):
+            img, max_size = read_detector_image(img_path, input_size)
+
+            #preprocess the image
+            X, _ = preprocess(img, input_size)
+            del img
+
+        # a keras.Model gets a tensor; checked by class so TensorFlow is only imported for keras models
+        if any(cls.__module__.startswith("keras") for cls in type(model).__mro__):
+            import tensorflow as tf #tensorflow ver 2.18.0
+            X = tf.convert_to_tensor(X, dtype=tf.float32)
+
+        # Object Localization for 
+        with timed("inference"):
+            predictions = model(X) #change
+
+        box = box_from_predictions(predictions, max_size)
+        if cache is not None:
+            cache.put(box_key, box)
+
+    with timed("crop"):
+        cropped_struk = read_crop(img_path, box)
     
     return cropped_struk
 
-def ocr_receipt(img_path, model):
-    cropped_image = object_localization(img_path, model)
+def read_text(cropped_image, ocr_pool=None):
+    """
+    Reads the text of a cropped receipt with tesseract.
+
+    Args:
+        cropped_image (numpy.ndarray): The localized receipt, see object_localization.
+        ocr_pool (OCRPool): Optional worker pool to run tesseract in, instead of the calling thread.
+
+    Returns:
+        str: The extracted text.
+    """
     options = "--psm 6"
-    extracted_text = pytesseract.image_to_string(
-        cv.cvtColor(cropped_image, cv.COLOR_BGR2RGB), config=options)
-    return extracted_text
+    cropped_image = cv.cvtColor(cropped_image, cv.COLOR_BGR2RGB)
+    with timed("tesseract"):
+        if ocr_pool is not None:
+            return ocr_pool.run(cropped_image)
+        return pytesseract.image_to_string(cropped_image, config=options)
+
+def ocr_receipt(img_path, model, ocr_pool=None, cache=None):
+    """
+    Localizes the receipt in an image and reads its text with tesseract.
+
+    Args:
+        img_path (str | bytes | numpy.ndarray): Path to the image file, its contents, or a decoded image.
+        model: The object detection model, see object_localization.
+        ocr_pool (OCRPool): Optional worker pool to run tesseract in, instead of the calling thread.
+        cache (ResultCache): Optional cache of boxes and OCR texts, keyed on the image's hash, so a
+            re-uploaded image skips localization and tesseract.
+
+    Returns:
+        str: The extracted text.
+    """
+    digest = None
+    if cache is not None:
+        digest = image_digest(img_path)
+        extracted_text = cache.get(f"ocr:{digest}")
+        cache_lookup("ocr", extracted_text is not None)
+        if extracted_text is not None:
+            return extracted_text
+
+    cropped_image = object_localization(img_path, model, cache=cache, digest=digest)
+    extracted_text = read_text(cropped_image, ocr_pool=ocr_pool)
+    if cache is not None:
+        cache.put(f"ocr:{digest}", extracted_text)
+    return extracted_text
\ No newline at end of file
@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+import pytesseract
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tesserocr
+    from PIL import Image
+except ImportError:
+    tesserocr = None
+
+OCR_CONFIG = "--psm 6"
+
+
+class OCRPoolBusy(RuntimeError):
+    """
+    Raised when the OCR queue is full and a job could not be queued in time.
+    """
+
+
+class OCRPool:
+    """
+    Bounded pool of OCR workers with a queue, backpressure and per-job timeouts.
+
+    Jobs run on `max_workers` worker threads instead of the Flask request thread. Recognition
+    happens outside the GIL, either in the tesseract binary that pytesseract runs or in the
+    tesseract C API, so the workers use every core without copying the process. With tesserocr
+    installed, each worker keeps one tesseract engine alive and reuses it, so no tesseract process
+    is forked per image. Without it, each job runs pytesseract.
+
+    At most `max_pending` jobs are queued or running at once. submit() waits up to
+    `submit_timeout` seconds for a slot and then raises OCRPoolBusy. A job that waited more than
+    `queue_timeout` seconds for a worker fails with OCRPoolBusy without running. Recognition itself
+    is limited to `timeout` seconds inside the job, after which it raises TimeoutError.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, timeout: float = 60.0,
+                 submit_timeout: float = 5.0, queue_timeout: float = 30.0, config: str = OCR_CONFIG):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self.timeout = timeout
+        self.submit_timeout = submit_timeout
+        self.queue_timeout = queue_timeout
+        self.config = config
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr")
+
+    def _image_to_string(self, image) -> str:
+        if tesserocr is None:
+            return pytesseract.image_to_string(image, config=self.config, timeout=self.timeout or 0)
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = self._local.api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_BLOCK)
+        api.SetImage(Image.fromarray(image))
+        # Recognize returns False once the timeout (in milliseconds) is up
+        if not api.Recognize(timeout=int((self.timeout or 0) * 1000)):
+            raise TimeoutError(f"OCR took longer than {self.timeout}s")
+        return api.GetUTF8Text()
+
+    def _job(self, image, queued_at: float) -> str:
+        waited = time.monotonic() - queued_at
+        if self.queue_timeout and waited > self.queue_timeout:
+            raise OCRPoolBusy(f"OCR job waited {waited:.1f}s for a worker")
+        return self._image_to_string(image)
+
+    def submit(self, image):
+        """
+        Queues an OCR job.
+
+        Args:
+            image (numpy.ndarray): RGB or grayscale image.
+
+        Returns:
+            concurrent.futures.Future: resolves to the extracted text.
+        """
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            raise OCRPoolBusy(f"OCR queue is full ({self.max_pending} jobs pending)")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._job, image, time.monotonic())
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def pending(self) -> int:
+        """
+        Number of OCR jobs queued or running.
+        """
+        with self._lock:
+            return self._pending
+
+    def run(self, image) -> str:
+        """
+        Submits an OCR job and waits for its text.
+
+        The job limits its own queue wait and recognition time; run() gives up after both limits
+        have passed and cancels the job if it has not started yet.
+        """
+        future = self.submit(image)
+        wait = (self.queue_timeout or 0) + self.timeout if self.timeout else None
+        try:
+            return future.result(timeout=wait)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
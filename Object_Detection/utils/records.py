@@ -0,0 +1,63 @@
+import json
+
+
+def to_record(document) -> dict:
+    """
+    Returns:
+        dict: the fields of a Firestore document snapshot along with its id.
+    """
+    return {"id": document.id, **document.to_dict()}
+
+
+def read_page(query, limit: int = None, start_after: str = None):
+    """
+    Reads one page of records.
+
+    Args:
+        query (firestore.Query): query of the records, ordered by document id.
+        limit (int): most records on the page. None reads every record after `start_after`.
+        start_after (str): id of the last record of the previous page.
+
+    Returns:
+        tuple: (list of records, id of the last record if more records follow, else None).
+    """
+    if start_after:
+        query = query.start_after({"__name__": start_after})
+    if limit is None:
+        return [to_record(document) for document in query.stream()], None
+    documents = list(query.limit(limit + 1).stream())
+    records = [to_record(document) for document in documents[:limit]]
+    next_cursor = records[-1]["id"] if len(documents) > limit else None
+    return records, next_cursor
+
+
+def stream_records(query):
+    """
+    Streams every record of `query` as the chunks of one JSON array.
+
+    The first record is read before this returns, so a query that fails outright raises here and
+    the caller can still answer with an error status. A failure once the response has started is
+    logged and closes the array with an {"error": ...} element, so the body stays valid JSON and
+    the client can tell that it is incomplete.
+
+    Returns:
+        iterator: str chunks of the JSON array.
+    """
+    documents = iter(query.stream())
+    first = next(documents, None)
+
+    def chunks():
+        yield "["
+        if first is None:
+            yield "]"
+            return
+        yield json.dumps(to_record(first), default=str)
+        try:
+            for document in documents:
+                yield "," + json.dumps(to_record(document), default=str)
+        except Exception as e:
+            print(f"Error streaming records: {e}")
+            yield "," + json.dumps({"error": f"Error streaming records: {str(e)}"})
+        yield "]"
+
+    return chunks()
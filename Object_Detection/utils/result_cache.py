@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from contextlib import closing
+
+
+def image_digest(source) -> str:
+    """
+    SHA-256 of an image's encoded bytes.
+
+    Args:
+        source (str | bytes | numpy.ndarray): Path to the image file, its contents, or a decoded image.
+
+    Returns:
+        str: hex digest.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    if isinstance(source, np.ndarray) and source.ndim > 1:
+        digest = hashlib.sha256(str(source.shape).encode())
+        digest.update(np.ascontiguousarray(source).data)
+        return digest.hexdigest()
+    return hashlib.sha256(source).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses runs of whitespace and drops blank lines, so OCR texts that only differ in spacing
+    share a cache entry.
+    """
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def text_digest(text: str) -> str:
+    """
+    SHA-256 of the normalized text.
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with per-entry expiry, with an optional SQLite file behind it.
+
+    Holds up to `max_entries` values in memory, evicting the least recently used. Entries expire
+    `ttl` seconds after they were stored (None keeps them until evicted). With `path`, entries are
+    also written to a SQLite file, so they survive restarts and are shared between the workers of
+    one host; a memory miss falls back to the file. Values on disk are pickled.
+
+    Cached values are shared between callers and must not be modified in place.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None, path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._writes = 0
+        if path is not None:
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS cache ("
+                    "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+                )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        """
+        Args:
+            key (str): cache key.
+            default: returned when the key is missing or expired.
+
+        Returns:
+            the cached value, or `default`.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] is None or entry[1] > now:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+        if self.path is None:
+            return default
+
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return default
+        value = pickle.loads(row[0])
+        with self._lock:
+            self._remember(key, value, row[1])
+        return value
+
+    def put(self, key: str, value, ttl: float = None):
+        """
+        Stores a value.
+
+        Args:
+            key (str): cache key.
+            value: any picklable value.
+            ttl (float): seconds until the entry expires, defaults to the cache's ttl.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._writes += 1
+            prune = self._writes % 256 == 0
+        if self.path is None:
+            return
+
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at),
+            )
+            if prune:
+                connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def put_many(self, items, ttl: float = None):
+        """
+        Stores many values at once, in a single SQLite transaction.
+
+        Args:
+            items (dict | iterable): key -> value mapping, or (key, value) pairs.
+            ttl (float): seconds until the entries expire, defaults to the cache's ttl.
+        """
+        items = list(items.items() if isinstance(items, dict) else items)
+        if not items:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value, expires_at)
+            self._writes += len(items)
+        if self.path is None:
+            return
+
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                ((key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at) for key, value in items),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.path is not None:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path is not None:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM cache")
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MISSING = object()
@@ -0,0 +1,109 @@
+import datetime
+import threading
+
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+PROJECT_ID = "capstone-bangkit-d0ca4"
+REGION = "us-central1"
+MODEL_NAME = "gemini-1.5-pro-002"
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+class VertexClient:
+    """
+    Process-wide Vertex AI client: service account credentials, vertexai.init and the Gemini model.
+
+    Everything is set up on first use and reused by later requests; vertexai itself (a couple of
+    seconds to import) is only imported then. The access token is refreshed
+    only when it is missing or expires within `refresh_margin` seconds. Safe to share between
+    threads. extract_dict only needs credentials() and generate(), so a fake with those two methods
+    can stand in for it.
+    """
+
+    def __init__(self, key_path: str, project: str = PROJECT_ID, region: str = REGION,
+                 model_name: str = MODEL_NAME, refresh_margin: float = 300):
+        self.key_path = key_path
+        self.project = project
+        self.region = region
+        self.model_name = model_name
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._model = None
+        self._request = Request()
+
+    def _expiring(self) -> bool:
+        credentials = self._credentials
+        if credentials.token is None or credentials.expiry is None:
+            return credentials.token is None
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (credentials.expiry - now).total_seconds() < self.refresh_margin
+
+    def credentials(self) -> Credentials:
+        """
+        Returns:
+            google.oauth2.service_account.Credentials: credentials holding a token that is valid
+                for at least `refresh_margin` more seconds.
+        """
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = Credentials.from_service_account_file(self.key_path, scopes=SCOPES)
+            if self._expiring():
+                self._credentials.refresh(self._request)
+            return self._credentials
+
+    def model(self):
+        """
+        Returns:
+            vertexai.generative_models.GenerativeModel: the Gemini model, after vertexai.init.
+        """
+        credentials = self.credentials()
+        with self._lock:
+            if self._model is None:
+                import vertexai
+                from vertexai.preview.generative_models import GenerativeModel
+                vertexai.init(project=self.project, location=self.region, credentials=credentials)
+                self._model = GenerativeModel(self.model_name)
+            return self._model
+
+    def generate(self, prompt: str, json_mode: bool = False) -> str:
+        """
+        Args:
+            prompt (str): the prompt to send to Gemini.
+            json_mode (bool): request a JSON response (structured output) instead of free text.
+
+        Returns:
+            str: the text of the first candidate of the response.
+        """
+        model = self.model()
+        from vertexai.preview.generative_models import GenerationConfig
+        generation_config = GenerationConfig(response_mime_type="application/json") if json_mode else None
+        response = model.generate_content([prompt], generation_config=generation_config)
+        return response.candidates[0].content.parts[0].text
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(key_path: str):
+    """
+    Returns the process-wide client of a service account key, creating it on first use.
+    """
+    with _clients_lock:
+        if key_path not in _clients:
+            _clients[key_path] = VertexClient(key_path)
+        return _clients[key_path]
+
+
+def set_client(key_path: str, client):
+    """
+    Replaces the client get_client returns for `key_path`, e.g. with a fake in tests. None removes it.
+    """
+    with _clients_lock:
+        if client is None:
+            _clients.pop(key_path, None)
+        else:
+            _clients[key_path] = client
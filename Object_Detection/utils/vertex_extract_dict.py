@@ -1,21 +1,18 @@
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
-
-from google.auth.transport.requests import Request
-from google.oauth2.service_account import Credentials
-
 import requests
-import json
+from Object_Detection.utils.result_cache import text_digest
+from Object_Detection.utils.vertex_client import get_client
+from Object_Detection.utils.llm_parser import parse_llm_dict
+from recommender.utils.metrics import timed, cache_lookup
 import re
-import os
 
-def geocode_address(address, credentials):
+def geocode_address(address, credentials, session=None):
     """
     Geocodes a given address using the Google Maps Geocoding API and service account credentials.
 
     Args:
         address (str): The address to be geocoded.
         credentials (google.oauth2.credentials.Credentials): An instance of Google service account credentials containing a valid token.
+        session (requests.Session): Optional session to reuse pooled connections from.
 
     Returns:
         tuple(float, float) or None, None: 
@@ -33,7 +30,8 @@ def geocode_address(address, credentials):
       "Authorization": f"Bearer {credentials.token}"
     }
     
-    response = requests.get(url, params=params, headers=headers)
+    with timed("geocode_api"):
+      response = (session or requests).get(url, params=params, headers=headers)
 
     if response.status_code == 200:
       response_json = response.json()
@@ -49,24 +47,30 @@ def geocode_address(address, credentials):
       print("Request failed with status code:", response.status_code)
       return None, None
 
-def extract_dict(receipt_ocr: str, key_path: str, uid: str, email: str):
+def validate_user(uid: str, email: str):
     """
-        Extract relevant informations parsed from an ocr of a receipt into a structured dictionary
-
-    Args:
-        receipt_ocr (string): a string from applying OCR to a shopping receipt.
-        key_path  : a string to a path containing the json key for google vertex ai.
-        uid       : user id.
-        email     : user email.
-    
-    Returns:
-        data: a dictionary of relevant informations, the contain is provided below in the prompt:
+        Checks the uid and email a receipt is recorded under, raising ValueError if either is malformed.
     """
     if len(uid) != 20:
       raise ValueError('UID is not 20 characters long')
     if re.fullmatch(r"^\w+([\.-]?\w+)*@\w+([\.-]?\w+)*(\.\w{2,3})+$", email) is None:
       raise ValueError('Email is not valid')
 
+def parse_receipt(receipt_ocr: str, key_path: str, cache=None, client=None, json_mode: bool = False):
+    """
+        Asks Gemini to parse the ocr of a receipt into a dictionary of lists, the format is provided below in the prompt.
+
+    Args:
+        receipt_ocr (string): a string from applying OCR to a shopping receipt.
+        key_path  : a string to a path containing the json key for google vertex ai.
+        cache     : optional ResultCache of parsed dictionaries, keyed on the hash of the normalized OCR text,
+                    so the same receipt is only sent to Gemini once.
+        client    : optional VertexClient (or a stand-in) to use instead of the process-wide client for key_path.
+        json_mode : ask Gemini for a JSON response (response_mime_type="application/json") instead of free text.
+
+    Returns:
+        parsed: the dictionary parsed from the model response, shared with the cache so it must not be modified.
+    """
     prompt = '''Provided below is an OCR of Indonesian shopping receipt. You will extract the relevant informations from the OCR text.
 
     Please return a string that needs to follow the format below (only return the dictionary string and nothing else).
@@ -107,17 +111,7 @@ def extract_dict(receipt_ocr: str, key_path: str, uid: str, email: str):
     '''
     Initializing Google Vertex AI
     '''
-    credentials = Credentials.from_service_account_file(
-        key_path,
-        scopes=["https://www.googleapis.com/auth/cloud-platform"]
-    )
-
-    if credentials.expired:
-      credentials.refresh(Request())
-
-    PROJECT_ID = "capstone-bangkit-d0ca4"
-    REGION = "us-central1"
-    vertexai.init(project=PROJECT_ID, location=REGION, credentials = credentials)
+    client = client or get_client(key_path)
 
     '''
     Configuring the prompt
@@ -126,30 +120,51 @@ def extract_dict(receipt_ocr: str, key_path: str, uid: str, email: str):
 
     prompt = prompt.replace("\'", '')
 
-    generative_multimodal_model = GenerativeModel("gemini-1.5-pro-002")
-    response = generative_multimodal_model.generate_content([prompt])
+    cache_key = f"dict:{text_digest(receipt_ocr)}"
+    parsed = cache.get(cache_key) if cache is not None else None
+    if cache is not None:
+      cache_lookup("dict", parsed is not None)
+    if parsed is None:
+      with timed("gemini"):
+        text = client.generate(prompt, json_mode=True) if json_mode else client.generate(prompt)
 
-    text = response.candidates[0].content.parts
-    text = text[0].text
+      parsed = parse_llm_dict(text)
+      if cache is not None:
+        cache.put(cache_key, parsed)
 
-    json_string = re.search(r'\{.*\}', text, re.DOTALL).group(0)
-    json_string = json_string.replace("'", '"')
+    return parsed
 
-    with open('llm_output.json', 'w') as file: #need this to capture output, do not remove
-        file.write(json_string)
+def geocode_receipt(parsed: dict, key_path: str, gazetteer=None, client=None):
+    """
+        Geocodes the purchase address of a parsed receipt.
 
-    with open('llm_output.json', 'r') as file:
-        data = json.load(file)
+    Args:
+        parsed    : dictionary returned by parse_receipt.
+        key_path  : a string to a path containing the json key for google vertex ai.
+        gazetteer : optional Gazetteer of known store addresses, so only unknown addresses are geocoded over HTTP.
+        client    : optional VertexClient (or a stand-in) to use instead of the process-wide client for key_path.
 
-    os.remove('llm_output.json')
+    Returns:
+        tuple(float, float) or None, None: latitude and longitude of the store.
+    """
+    #resolved only when the address has to be geocoded over HTTP, so known stores need neither the key nor a token
+    credentials = lambda: (client or get_client(key_path)).credentials()
+    if gazetteer is not None:
+      return gazetteer.geocode(parsed['purchase_address'][0], credentials)
+    return geocode_address(parsed['purchase_address'][0], credentials())
 
-    
+def receipt_rows(parsed: dict, uid: str, email: str, lat: float, long: float):
+    """
+        Completes a parsed receipt into purchase_history rows, one value per product in every key.
+
+    Returns:
+        data: a dictionary of lists, ready for pd.DataFrame.
+    """
+    data = dict(parsed)
     data['uid'] = [uid]
     data['email'] = [email]
     data['quantity'] = [1]
 
-    #get long lat
-    lat, long = geocode_address(data['purchase_address'][0], credentials)
     data['long'] = [long]
     data['lat'] = [lat]
 
@@ -162,3 +177,26 @@ def extract_dict(receipt_ocr: str, key_path: str, uid: str, email: str):
             data[key] = value * max_len
 
     return data
+
+def extract_dict(receipt_ocr: str, key_path: str, uid: str, email: str, cache=None, gazetteer=None, client=None,
+                 json_mode: bool = False):
+    """
+        Extract relevant informations parsed from an ocr of a receipt into a structured dictionary
+
+    Args:
+        receipt_ocr (string): a string from applying OCR to a shopping receipt.
+        key_path  : a string to a path containing the json key for google vertex ai.
+        uid       : user id.
+        email     : user email.
+        cache     : optional ResultCache of parsed dictionaries, see parse_receipt.
+        gazetteer : optional Gazetteer of known store addresses, so only unknown addresses are geocoded over HTTP.
+        client    : optional VertexClient (or a stand-in) to use instead of the process-wide client for key_path.
+        json_mode : ask Gemini for a JSON response (response_mime_type="application/json") instead of free text.
+    
+    Returns:
+        data: a dictionary of relevant informations, the contain is provided in the prompt of parse_receipt.
+    """
+    validate_user(uid, email)
+    parsed = parse_receipt(receipt_ocr, key_path, cache=cache, client=client, json_mode=json_mode)
+    lat, long = geocode_receipt(parsed, key_path, gazetteer=gazetteer, client=client)
+    return receipt_rows(parsed, uid, email, lat, long)
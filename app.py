@@ -1,40 +1,283 @@
+import time
+STARTUP_BEGIN = time.perf_counter()
+
 import os
+import atexit
+import threading
 import jwt as pyjwt
-import tensorflow as tf
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 from werkzeug.utils import secure_filename
-from google.cloud import firestore
 from google.oauth2 import service_account
 from Object_Detection.utils.object_localization import ocr_receipt
+from Object_Detection.utils.batching import MicroBatcher
+from Object_Detection.utils.model_server import RemoteLocalizer, BackgroundLocalizer
+from Object_Detection.utils.ocr_pool import OCRPool, OCRPoolBusy
+from Object_Detection.utils.records import read_page, stream_records
+from Object_Detection.utils.result_cache import ResultCache
+from Object_Detection.utils.geocoding import Gazetteer
+from Object_Detection.utils.batch_writer import BatchWriter, WriteQueueFull
 from recommender.full_deployment import full_deployment
+from recommender.utils.purchase_store import get_store
+from recommender.utils.recommendation_store import RecommendationStore
+from recommender.utils.job_queue import JobStore, JobQueue, JobQueueFull, DONE, FAILED
+from recommender.utils.metrics import REGISTRY, start_trace, end_trace, cache_lookup
 import re
 from functools import wraps
 import dotenv
 
+# Heavy dependencies are imported where they are first needed: TensorFlow when the model loads,
+# which happens on a background thread (or in the model server under gunicorn), Vertex AI on the
+# first Gemini call, Firestore on the first database call and scikit-learn when the recommender
+# first builds its profiles. startup_timings breaks down the rest; `python -X importtime app.py`
+# itemizes the imports.
+startup_timings = {"imports": time.perf_counter() - STARTUP_BEGIN}
+_startup_mark = time.perf_counter()
+
+
+def startup_phase(name):
+    """
+    Records how long the startup step that just finished took.
+    """
+    global _startup_mark
+    now = time.perf_counter()
+    startup_timings[name] = now - _startup_mark
+    _startup_mark = now
+
+
 dotenv.load_dotenv()
 
 app = Flask(__name__)
 
 MODEL_PATH = "./Object_Detection/Saved_Models/model.keras"
-UPLOAD_FOLDER = './uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# "keras" serves MODEL_PATH through a compiled tf.function (XLA with LOCALIZER_XLA=1), "tflite"
+# serves a model exported with `python -m Object_Detection.utils.inference --tflite`.
+LOCALIZER_BACKEND = os.getenv("LOCALIZER_BACKEND", "keras")
+LOCALIZER_XLA = os.getenv("LOCALIZER_XLA", "0") == "1"
+LOCALIZER_TFLITE_PATH = os.getenv("LOCALIZER_TFLITE_PATH", "./Object_Detection/Saved_Models/model.tflite")
+# With LOCALIZER_MAX_BATCH > 1, images from concurrent requests are localized together in batches
+# of up to that many, waiting at most LOCALIZER_MAX_WAIT_MS for a batch to fill.
+LOCALIZER_MAX_BATCH = int(os.getenv("LOCALIZER_MAX_BATCH", "1"))
+LOCALIZER_MAX_WAIT_MS = float(os.getenv("LOCALIZER_MAX_WAIT_MS", "5"))
+# Under gunicorn (gunicorn.conf.py) the model runs in one model-server process started by the
+# master, and the workers reach it over the Unix socket LOCALIZER_SOCKET.
+LOCALIZER_SOCKET = os.getenv("LOCALIZER_SOCKET")
+# Tesseract runs on OCR_WORKERS worker threads (0 runs it on the request thread). At most
+# OCR_MAX_PENDING jobs wait at once, for a worker for at most OCR_QUEUE_TIMEOUT_SECONDS, and
+# recognition is limited to OCR_TIMEOUT_SECONDS.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", str(4 * max(OCR_WORKERS, 1))))
+OCR_TIMEOUT_SECONDS = float(os.getenv("OCR_TIMEOUT_SECONDS", "60"))
+OCR_QUEUE_TIMEOUT_SECONDS = float(os.getenv("OCR_QUEUE_TIMEOUT_SECONDS", "30"))
+# Localization, OCR and Gemini extraction results are cached on the hash of the uploaded image
+# (and of the OCR text), so re-uploads of the same receipt are served from the cache. Set
+# RESULT_CACHE_PATH to also keep them in a SQLite file shared by the workers; 0 entries disables it.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH")
+# Geocoded store addresses are seeded from the purchase history and remembered; with
+# GEOCODE_CACHE_PATH they persist in a SQLite file across restarts.
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH")
+# Ask Gemini for a JSON response (structured output) instead of a Python-style dict string.
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "0") == "1"
+# /full-deployment/async jobs run on JOB_WORKERS background threads, at most JOB_MAX_PENDING per
+# process; their status and results are kept in the SQLite file JOBS_DB for JOB_RETENTION_SECONDS.
+# Jobs whose process exited, or still unfinished after JOB_STALE_SECONDS, are marked failed.
+JOBS_DB = os.getenv("JOBS_DB", "./jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "32"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "3600"))
+# /records returns every record unless paged: a page holds ?limit= records, up to
+# RECORDS_MAX_PAGE_SIZE, or RECORDS_PAGE_SIZE when only ?start_after= is given.
+RECORDS_PAGE_SIZE = int(os.getenv("RECORDS_PAGE_SIZE", "50"))
+RECORDS_MAX_PAGE_SIZE = int(os.getenv("RECORDS_MAX_PAGE_SIZE", "500"))
+RECORD_FIELDS = {"filename", "extracted_text", "total_amount", "uid"}
+# Requests sent with this header set to 1 get the durations of their stages back in a
+# Server-Timing response header. /metrics exposes the stage histograms of all requests.
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Trace")
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png'}
 JWT_SECRET = os.getenv("JWT_SECRET", "capstone_bangkit")
 JWT_ALGORITHM = "HS256"
+# Verified tokens are cached (up to JWT_CACHE_SIZE, 0 disables it) until their exp claim, or for
+# JWT_CACHE_TTL_SECONDS if they have none, so a reused token is not verified on every request.
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_TTL_SECONDS = float(os.getenv("JWT_CACHE_TTL_SECONDS", "300"))
 
 SERVICE_ACCOUNT_PATH = os.getenv("SERVICE_ACCOUNT_PATH", "./service-account.json")
+GOOGLE_KEY_PATH = os.getenv("GOOGLE_KEY_PATH", "./capstone-bangkit-d0ca4-7ff113bb4e31.json")
+DATASET_PATH = os.getenv("DATASET_PATH", "./recommender/dataset/purchase_history.csv")
+# When set, new receipt rows go to an append-only segmented log in this directory instead of
+# the dataset csv, which lets several workers share the dataset safely. gunicorn.conf.py sets it
+# (to receipt_log/ next to the dataset) unless it is given; a single process may leave it unset.
+RECEIPT_LOG_DIR = os.getenv("RECEIPT_LOG_DIR")
+RECEIPT_LOG_COMPACTION_SECONDS = float(os.getenv("RECEIPT_LOG_COMPACTION_SECONDS", "300"))
+# SQLite file written by `python -m recommender.precompute`; when set, /full-deployment serves
+# precomputed recommendations and only falls back to the recommender for users missing from it.
+# Entries older than PRECOMPUTED_MAX_AGE_SECONDS are recomputed on the request, so the uploaded
+# receipt shows in the recommendations unless the user's entry is more recent than that.
+RECOMMENDATIONS_DB = os.getenv("RECOMMENDATIONS_DB")
+PRECOMPUTED_MAX_AGE_SECONDS = float(os.getenv("PRECOMPUTED_MAX_AGE_SECONDS", "3600"))
+# /ocr records are written behind the response, in Firestore batches of up to FIRESTORE_BATCH_SIZE
+# records committed at most FIRESTORE_BATCH_WAIT_SECONDS after the first one; at most
+# FIRESTORE_MAX_PENDING records wait at once. FIRESTORE_WRITE_BEHIND=0 writes them in the request.
+FIRESTORE_WRITE_BEHIND = os.getenv("FIRESTORE_WRITE_BEHIND", "1") == "1"
+FIRESTORE_BATCH_SIZE = int(os.getenv("FIRESTORE_BATCH_SIZE", "100"))
+FIRESTORE_BATCH_WAIT_SECONDS = float(os.getenv("FIRESTORE_BATCH_WAIT_SECONDS", "0.5"))
+FIRESTORE_MAX_PENDING = int(os.getenv("FIRESTORE_MAX_PENDING", "10000"))
+# User documents (for the email) are cached for USER_CACHE_TTL_SECONDS; 0 reads them on every request.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+# With FIRESTORE_EMULATOR_HOST set (e.g. localhost:8080), the Firestore client talks to the
+# emulator of project FIRESTORE_PROJECT instead, without the service account.
+FIRESTORE_EMULATOR_HOST = os.getenv("FIRESTORE_EMULATOR_HOST")
+FIRESTORE_PROJECT = os.getenv("FIRESTORE_PROJECT", "demo-ocr-receipts")
 
-# Initialize Firestore client with credentials
-credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH)
-db = firestore.Client(credentials=credentials)
 COLLECTION_NAME = "ocr_receipts"
+_db = None
+_db_lock = threading.Lock()
 
-if not os.path.exists(MODEL_PATH):
-    raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
 
-model = tf.keras.models.load_model(MODEL_PATH)
-print("Model loaded successfully.")
+def get_db():
+    """
+    Firestore client with the service account credentials, created on first use.
+    """
+    global _db
+    with _db_lock:
+        if _db is None:
+            from google.cloud import firestore
+            if FIRESTORE_EMULATOR_HOST:
+                # the client reads FIRESTORE_EMULATOR_HOST itself and skips authentication
+                _db = firestore.Client(project=FIRESTORE_PROJECT)
+            else:
+                credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH)
+                _db = firestore.Client(credentials=credentials)
+        return _db
+
+
+def get_user(uid):
+    """
+    The user's Firestore document, cached for USER_CACHE_TTL_SECONDS.
+
+    Returns:
+        dict | None: the document fields, or None if the user does not exist.
+    """
+    key = f"user:{uid}"
+    user_data = user_cache.get(key) if user_cache is not None else None
+    if user_cache is not None:
+        cache_lookup("user", user_data is not None)
+    if user_data is None:
+        user_doc = get_db().collection("users").document(uid).get()
+        if not user_doc.exists:
+            return None
+        user_data = user_doc.to_dict()
+        if user_cache is not None:
+            user_cache.put(key, user_data)
+    return user_data
+
+
+def load_model():
+    """
+    Loads the localizer (and TensorFlow) and warms it up, in the configured LOCALIZER_* serving mode.
+    """
+    from Object_Detection.utils.inference import load_localizer
+    localizer = load_localizer(localizer_path, backend=LOCALIZER_BACKEND, jit_compile=LOCALIZER_XLA,
+                               max_batch=LOCALIZER_MAX_BATCH)
+    if LOCALIZER_MAX_BATCH > 1:
+        localizer = MicroBatcher(localizer.predict_batch, max_batch=LOCALIZER_MAX_BATCH,
+                                 max_wait_ms=LOCALIZER_MAX_WAIT_MS)
+    return localizer
+
+
+if LOCALIZER_SOCKET:
+    model = RemoteLocalizer(LOCALIZER_SOCKET)
+else:
+    localizer_path = LOCALIZER_TFLITE_PATH if LOCALIZER_BACKEND == "tflite" else MODEL_PATH
+    if not os.path.exists(localizer_path):
+        raise FileNotFoundError(f"Model file not found at {localizer_path}")
+
+    model = BackgroundLocalizer(load_model)
+startup_phase("model")
+
+ocr_pool = OCRPool(max_workers=OCR_WORKERS, max_pending=OCR_MAX_PENDING, timeout=OCR_TIMEOUT_SECONDS,
+                   queue_timeout=OCR_QUEUE_TIMEOUT_SECONDS) if OCR_WORKERS > 0 else None
+
+result_cache = ResultCache(max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL_SECONDS,
+                           path=RESULT_CACHE_PATH) if RESULT_CACHE_SIZE > 0 else None
+
+token_cache = ResultCache(max_entries=JWT_CACHE_SIZE) if JWT_CACHE_SIZE > 0 else None
+user_cache = ResultCache(max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS) \
+    if USER_CACHE_SIZE > 0 and USER_CACHE_TTL_SECONDS > 0 else None
+
+startup_phase("caches")
+
+purchase_store = get_store(DATASET_PATH, log_dir=RECEIPT_LOG_DIR)
+if purchase_store.log is not None:
+    purchase_store.log.start_compactor(RECEIPT_LOG_COMPACTION_SECONDS)
+
+
+def get_gazetteer() -> Gazetteer:
+    """
+    The gazetteer derived from the purchase history. Looked up on every use, since reloading the
+    store drops its derived structures and the next lookup builds a fresh one.
+    """
+    return purchase_store.derived("gazetteer", lambda df: Gazetteer.from_frame(df, path=GEOCODE_CACHE_PATH))
+
+
+# seeded at startup rather than on the first upload
+get_gazetteer()
+startup_phase("purchase_store")
+precomputed_recommendations = RecommendationStore(RECOMMENDATIONS_DB) if RECOMMENDATIONS_DB else None
+jobs = JobStore(JOBS_DB)
+job_queue = JobQueue(jobs, max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, retention=JOB_RETENTION_SECONDS,
+                     stale_after=JOB_STALE_SECONDS)
+record_writer = BatchWriter(get_db, COLLECTION_NAME, max_batch=FIRESTORE_BATCH_SIZE,
+                            max_wait=FIRESTORE_BATCH_WAIT_SECONDS,
+                            max_pending=FIRESTORE_MAX_PENDING) if FIRESTORE_WRITE_BEHIND else None
+if record_writer is not None:
+    atexit.register(record_writer.close)
+startup_phase("stores")
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Duration of HTTP requests by route, method and status.", ["route", "method", "status"])
+REGISTRY.gauge("ocr_queue_depth", "OCR jobs queued or running in this process.",
+               function=lambda: ocr_pool.pending() if ocr_pool is not None else 0)
+REGISTRY.gauge("job_queue_depth", "/full-deployment/async jobs queued or running in this process.",
+               function=job_queue.pending)
+REGISTRY.gauge("firestore_write_queue_depth", "/ocr records waiting to be written to Firestore.",
+               function=lambda: record_writer.pending() if record_writer is not None else 0)
+REGISTRY.gauge("result_cache_entries", "Entries in the in-memory result cache.",
+               function=lambda: len(result_cache) if result_cache is not None else 0)
+REGISTRY.gauge("model_ready", "1 once the localization model can serve requests.",
+               function=lambda: int(model.ready()))
+startup_timings["total"] = time.perf_counter() - STARTUP_BEGIN
+print("Startup: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items())
+      + ("; loading the model in the background" if isinstance(model, BackgroundLocalizer) else ""))
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    if request.headers.get(TRACE_HEADER) == "1":
+        g.trace, g.trace_token = start_trace()
+
+
+@app.after_request
+def record_request_timing(response):
+    seconds = time.perf_counter() - g.request_start
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUEST_SECONDS.observe(seconds, route=route, method=request.method, status=response.status_code)
+    trace = g.get("trace")
+    if trace is not None:
+        trace.add("total", seconds)
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.teardown_request
+def end_request_trace(exc):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        end_trace(token)
+
 
 def allowed_file(filename):
     """
@@ -43,6 +286,26 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def decode_token(token):
+    """
+    Verifies a JWT and returns its claims, from the cache of verified tokens when possible.
+
+    Raises:
+        jwt.InvalidTokenError: (or its subclass ExpiredSignatureError) if the token is not valid.
+    """
+    decoded = token_cache.get(token) if token_cache is not None else None
+    if token_cache is not None:
+        cache_lookup("jwt", decoded is not None)
+    if decoded is None:
+        decoded = pyjwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        if token_cache is not None:
+            expires_at = decoded.get("exp")
+            ttl = expires_at - time.time() if isinstance(expires_at, (int, float)) else JWT_CACHE_TTL_SECONDS
+            if ttl > 0:
+                token_cache.put(token, decoded, ttl=ttl)
+    return decoded
+
+
 def authenticate_request(func):
     """
     Middleware to authenticate requests using JWT.
@@ -53,7 +316,7 @@ def authenticate_request(func):
         if not token:
             return jsonify({"error": "No token provided"}), 403
         try:
-            decoded = pyjwt.decode(token.split(" ")[1], JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            decoded = decode_token(token.split(" ")[1])
             request.uid = decoded.get("userId")
             return func(*args, **kwargs)
         except pyjwt.ExpiredSignatureError:
@@ -104,12 +367,11 @@ def ocr_receipt_api():
     file = request.files['file']
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        print(f"File uploaded: {file_path}")
+        image_bytes = file.read()
+        print(f"File uploaded: {filename} ({len(image_bytes)} bytes)")
 
         try:
-            extracted_text_raw = ocr_receipt(file_path, model)
+            extracted_text_raw = ocr_receipt(image_bytes, model, ocr_pool=ocr_pool, cache=result_cache)
             extracted_text_clean = extracted_text_raw.strip()
 
             lines = [line.strip() for line in extracted_text_clean.split("\n") if line.strip()]
@@ -124,101 +386,272 @@ def ocr_receipt_api():
                 "uid": request.uid,
             }
 
-            db.collection(COLLECTION_NAME).add(record)
+            if record_writer is not None:
+                record_writer.add(record)
+            else:
+                get_db().collection(COLLECTION_NAME).add(record)
 
             return jsonify(record), 200
+        except (OCRPoolBusy, WriteQueueFull) as e:
+            return jsonify({"error": f"Server busy, please retry: {str(e)}"}), 503
         except Exception as e:
             print(f"Error during OCR: {e}")
             return jsonify({"error": f"Error during OCR: {str(e)}"}), 500
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
     else:
         return jsonify({"error": "Invalid file type"}), 400
 
 
+def full_deployment_request():
+    """
+    Validates a /full-deployment upload and collects the arguments of full_deployment.
+
+    Returns:
+        tuple(dict, None) | tuple(None, tuple): the full_deployment keyword arguments, or an error response.
+    """
+    if not request.uid:
+        return None, (jsonify({"error": "UID is missing"}), 400)
+
+    if 'file' not in request.files:
+        return None, (jsonify({"error": "No file uploaded"}), 400)
+
+    file = request.files['file']
+    if not (file and allowed_file(file.filename)):
+        return None, (jsonify({"error": "Invalid file type"}), 400)
+
+    filename = secure_filename(file.filename)
+    image_bytes = file.read()
+    print(f"File uploaded: {filename} ({len(image_bytes)} bytes)")
+
+    user_data = get_user(request.uid)
+
+    if user_data is None:
+        return None, (jsonify({"error": "User not found"}), 404)
+
+    email = user_data.get("email")
+
+    lon = request.form.get("lon", 106.8272)
+    lat = request.form.get("lat", -6.1751)
+
+    try:
+        lon = float(lon)
+        lat = float(lat)
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            return None, (jsonify({"error": "Invalid longitude or latitude values."}), 400)
+    except ValueError:
+        return None, (jsonify({"error": "Longitude and latitude must be numeric."}), 400)
+
+    max_km = request.form.get("max_km")
+    k = request.form.get("k")
+    try:
+        max_km = float(max_km) if max_km is not None else None
+        k = int(k) if k is not None else None
+        if (max_km is not None and max_km <= 0) or (k is not None and k < 1):
+            return None, (jsonify({"error": "max_km and k must be positive."}), 400)
+    except ValueError:
+        return None, (jsonify({"error": "max_km must be numeric and k must be an integer."}), 400)
+
+    return dict(
+        key_path=GOOGLE_KEY_PATH,
+        test_path=image_bytes,
+        dataset_path=purchase_store,
+        uid=request.uid,
+        email=email,
+        model=model,
+        lon=lon,
+        lat=lat,
+        max_km=max_km,
+        k=k,
+        precomputed=precomputed_recommendations,
+        precomputed_max_age=PRECOMPUTED_MAX_AGE_SECONDS,
+        ocr_pool=ocr_pool,
+        cache=result_cache,
+        gazetteer=get_gazetteer(),
+        json_mode=LLM_JSON_MODE,
+    ), None
+
+
+def full_deployment_records(**kwargs):
+    """
+    Runs full_deployment and returns the recommendations as a list of records.
+    """
+    recommendations = full_deployment(**kwargs)
+    return recommendations.to_dict(orient="records")
+
+
 @app.route('/full-deployment', methods=['POST'])
 @authenticate_request
 def full_deployment_api():
     """
     API endpoint where the user uploads a photo and optionally provides longitude and latitude.
     """
-    if not request.uid:
-        return jsonify({"error": "UID is missing"}), 400
+    try:
+        kwargs, error = full_deployment_request()
+        if error is not None:
+            return error
+
+        result = full_deployment_records(**kwargs)
+        return jsonify({"status": "success", "recommendations": result}), 200
+    except OCRPoolBusy as e:
+        return jsonify({"error": f"Server busy, please retry: {str(e)}"}), 503
+    except Exception as e:
+        print(f"Error during processing: {e}")
+        return jsonify({"error": f"Error during processing: {str(e)}"}), 500
 
-    if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
 
-    file = request.files['file']
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        print(f"File uploaded: {file_path}")
+@app.route('/full-deployment/async', methods=['POST'])
+@authenticate_request
+def full_deployment_async_api():
+    """
+    Same as /full-deployment, but queues the work and returns a job id right away.
+    Poll /jobs/<job_id> for the status and fetch the recommendations from /jobs/<job_id>/result.
+    """
+    try:
+        kwargs, error = full_deployment_request()
+        if error is not None:
+            return error
+
+        job_id = job_queue.submit(request.uid, full_deployment_records, **kwargs)
+        return jsonify({
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}",
+            "result_url": f"/jobs/{job_id}/result",
+        }), 202
+    except JobQueueFull as e:
+        return jsonify({"error": f"Server busy, please retry: {str(e)}"}), 503
+    except Exception as e:
+        print(f"Error queueing job: {e}")
+        return jsonify({"error": f"Error queueing job: {str(e)}"}), 500
 
-        try:
-            user_ref = db.collection("users").document(request.uid)
-            user_doc = user_ref.get()
-
-            if not user_doc.exists:
-                return jsonify({"error": "User not found"}), 404
-
-            user_data = user_doc.to_dict()
-            email = user_data.get("email")
-
-            lon = request.form.get("lon", 106.8272)
-            lat = request.form.get("lat", -6.1751)
-
-            try:
-                lon = float(lon)
-                lat = float(lat)
-                if not (-180 <= lon <= 180 and -90 <= lat <= 90):
-                    return jsonify({"error": "Invalid longitude or latitude values."}), 400
-            except ValueError:
-                return jsonify({"error": "Longitude and latitude must be numeric."}), 400
-
-            key_path = os.getenv("GOOGLE_KEY_PATH", "./capstone-bangkit-d0ca4-7ff113bb4e31.json")
-            dataset_path = os.getenv("DATASET_PATH", "./recommender/dataset/purchase_history.csv")
-
-            recommendations = full_deployment(
-                key_path=key_path,
-                test_path=file_path,
-                dataset_path=dataset_path,
-                uid=request.uid,
-                email=email,
-                model=model,
-                lon=lon,
-                lat=lat,
-            )
-
-            result = recommendations.to_dict(orient="records")
-            return jsonify({"status": "success", "recommendations": result}), 200
-        except Exception as e:
-            print(f"Error during processing: {e}")
-            return jsonify({"error": f"Error during processing: {str(e)}"}), 500
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-    else:
-        return jsonify({"error": "Invalid file type"}), 400
 
+def user_job(job_id, with_result=False):
+    """
+    Returns the job if it exists and belongs to the requesting user, else None.
+    """
+    job = jobs.get(job_id, with_result=with_result)
+    if job is None or job["uid"] != request.uid:
+        return None
+    return job
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@authenticate_request
+def job_status(job_id):
+    """
+    API endpoint to poll the status of a /full-deployment/async job.
+    """
+    job = user_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+    }), 200
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+@authenticate_request
+def job_result(job_id):
+    """
+    API endpoint to fetch the recommendations of a finished /full-deployment/async job.
+    """
+    job = user_job(job_id, with_result=True)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] == FAILED:
+        return jsonify({"status": job["status"], "error": f"Error during processing: {job['error']}"}), 500
+    if job["status"] != DONE:
+        return jsonify({"status": job["status"], "job_id": job["id"]}), 202
+    return jsonify({"status": "success", "recommendations": job["result"]}), 200
+
+
+def records_query(uid, fields=None):
+    """
+    Firestore query of a user's OCR records in document id order, optionally projected to `fields`.
+    """
+    query = get_db().collection(COLLECTION_NAME).where("uid", "==", uid).order_by("__name__")
+    if fields:
+        query = query.select(fields)
+    return query
 
 
 @app.route('/records', methods=['GET'])
 @authenticate_request
 def get_records():
     """
-    API endpoint to fetch all stored OCR records from Firestore.
+    API endpoint to fetch the stored OCR records of the user from Firestore, a page at a time.
+
+    Query parameters:
+        limit: records per page, at most RECORDS_MAX_PAGE_SIZE. Without limit and start_after
+            every record is returned, as before paging existed.
+        start_after: id of the last record of the previous page; the page holds RECORDS_PAGE_SIZE
+            records unless limit is given. The response's X-Next-Cursor header holds the value for
+            the next page, and is absent on the last page.
+        fields: comma-separated fields to return besides the id, e.g. fields=filename,total_amount
+            to skip the extracted text.
+        stream: with stream=1 every record is streamed as one JSON array instead, without paging.
+            If reading fails midway, the array ends with an {"error": ...} element.
     """
+    fields = request.args.get("fields")
+    if fields:
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = sorted(set(fields) - RECORD_FIELDS)
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    start_after = request.args.get("start_after")
+    limit = request.args.get("limit")
     try:
-        records = db.collection(COLLECTION_NAME).where("uid", "==", request.uid).stream()
-        result = [{"id": record.id, **record.to_dict()} for record in records]
-        return jsonify(result), 200
+        if limit is not None:
+            limit = int(limit)
+            if not 1 <= limit <= RECORDS_MAX_PAGE_SIZE:
+                raise ValueError
+        elif start_after:
+            limit = RECORDS_PAGE_SIZE
+    except ValueError:
+        return jsonify({"error": f"limit must be an integer between 1 and {RECORDS_MAX_PAGE_SIZE}."}), 400
+
+    try:
+        query = records_query(request.uid, fields)
+
+        if request.args.get("stream") == "1":
+            return Response(stream_with_context(stream_records(query)), mimetype="application/json")
+
+        result, next_cursor = read_page(query, limit=limit, start_after=start_after)
+        response = jsonify(result)
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
     except Exception as e:
         print(f"Error fetching records: {e}")
         return jsonify({"error": f"Error fetching records: {str(e)}"}), 500
 
 
+@app.route('/ready')
+def ready():
+    """
+    Readiness check: 503 until the model can serve requests. Reports the startup timings.
+    """
+    report = {"startup": startup_timings}
+    if isinstance(model, BackgroundLocalizer):
+        report["model_load"] = model.load_seconds
+    if not model.ready():
+        return jsonify({"status": "starting", **report}), 503
+    return jsonify({"status": "ready", **report}), 200
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Prometheus metrics of this worker process: request and stage latency histograms, queue depths
+    and cache hit rates.
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route('/')
 def index():
     """
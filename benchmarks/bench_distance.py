@@ -0,0 +1,55 @@
+"""
+Benchmark of the store-to-user distance step of cheap_proximity_rec: geopy's great_circle applied
+row by row (the previous implementation) against the batched NumPy kernel.
+
+Usage:
+    python -m benchmarks.bench_distance --rows 1000 10000 100000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from geopy.distance import great_circle
+from recommender.utils.distance import great_circle_km
+
+
+def geopy_distance(df: pd.DataFrame, lat: float, lon: float) -> pd.Series:
+    return df.apply(lambda row: great_circle((row['lat'], row['long']), (lat, lon)).kilometers, axis=1)
+
+
+def numpy_distance(df: pd.DataFrame, lat: float, lon: float) -> np.ndarray:
+    return great_circle_km(df['lat'], df['long'], lat, lon)
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    lat, lon = -6.1751, 106.8272
+    print(f"{'rows':>10} {'geopy (s)':>12} {'numpy (s)':>12} {'speedup':>10} {'max |diff| km':>15}")
+    for rows in args.rows:
+        df = pd.DataFrame({
+            'lat': rng.uniform(-11.0, 6.0, rows),
+            'long': rng.uniform(95.0, 141.0, rows),
+        })
+        geopy_time = best_of(lambda: geopy_distance(df, lat, lon), args.repeat)
+        numpy_time = best_of(lambda: numpy_distance(df, lat, lon), args.repeat)
+        max_diff = np.max(np.abs(geopy_distance(df, lat, lon).to_numpy() - numpy_distance(df, lat, lon)))
+        print(f"{rows:>10} {geopy_time:>12.4f} {numpy_time:>12.6f} {geopy_time / numpy_time:>9.0f}x {max_diff:>15.2e}")
+
+
+if __name__ == "__main__":
+    main()
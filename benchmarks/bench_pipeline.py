@@ -0,0 +1,285 @@
+"""
+Benchmark of the receipt -> recommendation pipeline on synthetic purchase histories of growing size.
+
+For each scale (users x rows x stores, see benchmarks.synthetic) it times recommend,
+cheap_proximity_rec, full_deployment and object_localization, and reports throughput, latency
+percentiles and the peak RSS of each. Gemini and the Geocoding API are stubbed: the LLM returns a
+fixed receipt of catalog products and addresses are geocoded from the synthetic stores. Without
+--model the localization model is a stub returning a fixed box (decoding and preprocessing are still
+timed), and without a tesseract binary OCR is stubbed too; the stubs in use are recorded in the output.
+
+Results are written as JSON, so runs of different releases can be compared.
+
+Usage:
+    python -m benchmarks.bench_pipeline --scale 100 1000 20 --scale 1000 100000 200 -o bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+import cv2 as cv
+from benchmarks.synthetic import purchase_history
+from recommender.utils.purchase_store import PurchaseHistoryStore
+from recommender.utils.product_recommender import recommend
+from recommender.utils.cheap_close import cheap_proximity_rec
+from recommender.full_deployment import full_deployment
+from Object_Detection.utils.object_localization import object_localization
+from Object_Detection.utils.geocoding import Gazetteer
+from Object_Detection.utils.vertex_client import set_client
+
+OPERATIONS = ["recommend", "cheap_proximity_rec", "full_deployment", "object_localization"]
+PERCENTILES = [50, 90, 95, 99]
+KEY_PATH = "benchmark-stub-key.json"
+
+
+class StubCredentials:
+    token = "stub"
+
+
+class StubVertexClient:
+    """
+    Stands in for VertexClient: returns a fixed receipt of `products` bought at `address`.
+    """
+
+    def __init__(self, address: str, products: list[str], prices: list[float]):
+        self.response = json.dumps({
+            "purchase_date": ["2024-12-01"],
+            "purchase_address": [address],
+            "product_name": list(products),
+            "purchase_price": [float(price) for price in prices],
+            "product_type": ["unknown"] * len(products),
+        })
+
+    def credentials(self):
+        return StubCredentials()
+
+    def generate(self, prompt: str, json_mode: bool = False) -> str:
+        return self.response
+
+
+class StubOCR:
+    """
+    Stands in for OCRPool when tesseract is not installed.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def run(self, image) -> str:
+        return self.text
+
+
+class StubLocalizer:
+    """
+    Stands in for the localization model: predicts the same box for every image.
+    """
+
+    def __call__(self, X):
+        return [None, np.array([[0.15, 0.05, 0.85, 1.0]], dtype=np.float32)]
+
+
+def receipt_image(width: int, height: int, lines: list[str]) -> bytes:
+    """
+    Returns:
+        bytes: a JPEG photo-sized image of a white receipt holding `lines` on a gray background.
+    """
+    img = np.full((height, width, 3), 90, dtype=np.uint8)
+    x_min, x_max = int(width * 0.15), int(width * 0.85)
+    cv.rectangle(img, (x_min, int(height * 0.05)), (x_max, height - 1), (245, 245, 245), -1)
+    scale = width / 1000
+    for i, line in enumerate(lines):
+        y = int(height * 0.1 + i * 60 * scale)
+        cv.putText(img, line, (x_min + int(40 * scale), y), cv.FONT_HERSHEY_SIMPLEX, scale, (20, 20, 20),
+                   max(1, int(2 * scale)))
+    ok, encoded = cv.imencode(".jpg", img, [cv.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def reset_peak_rss() -> bool:
+    """
+    Resets the peak RSS of the process (Linux only), so each operation reports its own peak.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # high-water mark of the whole run: kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def measure(func, samples: int, warmup: int) -> dict:
+    """
+    Calls func(i) `warmup` times untimed, then `samples` times timed.
+
+    Returns:
+        dict: samples, total_seconds, throughput_per_second, latency_ms (mean, p50, p90, p95, p99, max)
+            and peak_rss_mb.
+    """
+    for i in range(warmup):
+        func(i)
+    reset_peak_rss()
+    latencies = np.empty(samples)
+    start = time.perf_counter()
+    for i in range(samples):
+        call_start = time.perf_counter()
+        func(warmup + i)
+        latencies[i] = time.perf_counter() - call_start
+    total = time.perf_counter() - start
+    latency_ms = {"mean": float(latencies.mean() * 1000), "max": float(latencies.max() * 1000)}
+    for percentile in PERCENTILES:
+        latency_ms[f"p{percentile}"] = float(np.percentile(latencies, percentile) * 1000)
+    return {
+        "samples": samples,
+        "total_seconds": total,
+        "throughput_per_second": samples / total if total > 0 else None,
+        "latency_ms": latency_ms,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_scale(users: int, rows: int, stores: int, args, model, image: bytes, ocr_pool, workdir: str) -> list[dict]:
+    """
+    Runs the selected operations on one synthetic dataset.
+
+    Returns:
+        list[dict]: one result per operation, see measure.
+    """
+    df = purchase_history(users, rows, stores, products=args.products, seed=args.seed)
+    dataset_path = os.path.join(workdir, f"purchase_history_{users}_{rows}_{stores}.csv")
+    df.to_csv(dataset_path, index=False)
+
+    rng = np.random.default_rng(args.seed)
+    uids = df['uid'].unique()
+    emails = df.drop_duplicates('uid').set_index('uid')['email']
+    picks = [str(uid) for uid in rng.choice(uids, args.warmup + args.samples)]
+    lon, lat = float(df['long'].mean()), float(df['lat'].mean())
+
+    # loading the csv and building the derived indexes is timed once, as a cold start
+    start = time.perf_counter()
+    reset_peak_rss()
+    store = PurchaseHistoryStore(dataset_path)
+    recommend(store, picks[0])
+    cold_start = time.perf_counter() - start
+    results = [{"operation": "cold_start", "samples": 1, "total_seconds": cold_start,
+                "throughput_per_second": None, "latency_ms": {"mean": cold_start * 1000},
+                "peak_rss_mb": peak_rss_mb()}]
+
+    # cheap_proximity_rec is timed on the products recommend picked for each user
+    recommendations = {uid: recommend(store, uid) for uid in set(picks)}
+    gazetteer = Gazetteer.from_frame(df, geocode=lambda address, credentials: (lat, lon))
+    receipt = df.drop_duplicates('product_name').head(8)
+    set_client(KEY_PATH, StubVertexClient(df['purchase_address'].iloc[0], receipt['product_name'],
+                                          receipt['purchase_price']))
+    operations = {
+        "recommend": lambda i: recommend(store, picks[i]),
+        "cheap_proximity_rec": lambda i: cheap_proximity_rec(
+            store, picks[i], recommendations[picks[i]], lon, lat, max_km=args.max_km, k=args.k),
+        "full_deployment": lambda i: full_deployment(
+            KEY_PATH, image, store, picks[i], emails[picks[i]], model, lon, lat, max_km=args.max_km, k=args.k,
+            ocr_pool=ocr_pool, gazetteer=gazetteer, json_mode=True),
+        "object_localization": lambda i: object_localization(image, model),
+    }
+    try:
+        for operation in args.operations:
+            result = measure(operations[operation], args.samples, args.warmup)
+            results.append({"operation": operation, **result})
+    finally:
+        set_client(KEY_PATH, None)
+
+    for result in results:
+        result.update(users=users, rows=rows, stores=stores)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, nargs=3, action="append", metavar=("USERS", "ROWS", "STORES"),
+                        help="dataset size, may be repeated (default: 100 1000 20, 1000 10000 100, 10000 100000 500)")
+    parser.add_argument("--products", type=int, default=200, help="size of the product catalog")
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=OPERATIONS)
+    parser.add_argument("--samples", type=int, default=50, help="timed calls per operation and scale")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed calls before the timed ones")
+    parser.add_argument("--max-km", type=float, default=None)
+    parser.add_argument("-k", type=int, default=None)
+    parser.add_argument("--model", help="path to the .keras model (default: a stub returning a fixed box)")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[3024, 4032], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    args = parser.parse_args()
+    scales = args.scale or [[100, 1_000, 20], [1_000, 10_000, 100], [10_000, 100_000, 500]]
+
+    if args.model:
+        from Object_Detection.utils.inference import load_localizer
+        model = load_localizer(args.model)
+    else:
+        model = StubLocalizer()
+    lines = ["TOKO 00000", "JL. PEMUDA NO.1, SEMARANG"] + [f"PRODUCT {i:05d}  1  8.500" for i in range(8)]
+    image = receipt_image(*args.image_size, lines)
+    ocr_pool = None if shutil.which("tesseract") else StubOCR("\n".join(lines))
+
+    results = []
+    print(f"{'users':>8} {'rows':>9} {'stores':>7} {'operation':>20} {'ops/s':>9} {'p50 ms':>9} "
+          f"{'p99 ms':>9} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for users, rows, stores in scales:
+            for result in bench_scale(users, rows, stores, args, model, image, ocr_pool, workdir):
+                results.append(result)
+                latency = result["latency_ms"]
+                throughput = result["throughput_per_second"]
+                print(f"{users:>8} {rows:>9} {stores:>7} {result['operation']:>20} "
+                      f"{throughput if throughput is not None else float('nan'):>9.1f} "
+                      f"{latency.get('p50', latency['mean']):>9.2f} {latency.get('p99', latency['mean']):>9.2f} "
+                      f"{result['peak_rss_mb']:>9.1f}")
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "stubs": {
+                "llm": True,
+                "geocoding": True,
+                "model": not args.model,
+                "ocr": ocr_pool is not None,
+            },
+            "args": {key: value for key, value in vars(args).items() if key != "scale"} | {"scale": scales},
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Synthetic purchase_history datasets of any size, for the benchmarks.
+
+A Python counterpart of recommender/dataset/generate_dummy_data.R. `users` shoppers buy from a
+catalog of `products` at `stores` stores scattered within `radius_km` of Semarang. Each store sells
+every product at its own price around the product's base price. Everything is drawn from one seed,
+so the same arguments always give the same dataset.
+
+Usage:
+    python -m benchmarks.synthetic --users 1000 --rows 100000 --stores 200 -o purchase_history.csv
+"""
+import argparse
+import string
+import numpy as np
+import pandas as pd
+from recommender.utils.purchase_store import COLUMNS
+
+PRODUCT_TYPES = ["minuman manis", "minuman sehat", "personal hygiene", "makanan manis", "makanan gurih",
+                 "unknown", "makanan pokok", "produk dewasa"]
+
+BASE_LONG = 110.435700
+BASE_LAT = -7.056400
+
+
+def random_strings(rng: np.random.Generator, n: int, length: int) -> np.ndarray:
+    characters = np.array(list(string.ascii_lowercase + string.digits))
+    return np.array(["".join(chars) for chars in rng.choice(characters, size=(n, length))])
+
+
+def catalog(rng: np.random.Generator, products: int) -> pd.DataFrame:
+    """
+    Returns:
+        pd.DataFrame: product_name, product_type and base_price (rupiah, rounded to 100) of each product.
+    """
+    return pd.DataFrame({
+        'product_name': [f"PRODUCT {i:05d}" for i in range(products)],
+        'product_type': rng.choice(PRODUCT_TYPES, products),
+        'base_price': np.round(rng.lognormal(np.log(8000), 0.6, products), -2),
+    })
+
+
+def store_locations(rng: np.random.Generator, stores: int, radius_km: float = 10.0) -> pd.DataFrame:
+    """
+    Returns:
+        pd.DataFrame: purchase_address, long and lat of each store, uniformly spread over a disc.
+    """
+    angle = rng.uniform(0, 2 * np.pi, stores)
+    distance = radius_km * np.sqrt(rng.uniform(0, 1, stores))
+    lat = BASE_LAT + np.degrees(distance * np.cos(angle) / 6371.0)
+    lon = BASE_LONG + np.degrees(distance * np.sin(angle) / (6371.0 * np.cos(np.radians(BASE_LAT))))
+    return pd.DataFrame({
+        'purchase_address': [f"TOKO {i:05d}\nJL. PEMUDA NO.{i % 200 + 1}, SEMARANG" for i in range(stores)],
+        'long': lon,
+        'lat': lat,
+    })
+
+
+def purchase_history(users: int, rows: int, stores: int, products: int = 200, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a purchase_history dataset.
+
+    Args:
+        users (int): number of distinct users; every user has at least one row when rows >= users.
+        rows (int): number of purchase rows.
+        stores (int): number of distinct store locations.
+        products (int): size of the product catalog.
+        seed (int): random seed.
+
+    Returns:
+        pd.DataFrame: rows in the purchase_history column layout. uids are 20 characters long,
+            like Firebase uids, so the generated users pass full_deployment's checks.
+    """
+    rng = np.random.default_rng(seed)
+    uids = random_strings(rng, users, 20)
+    emails = np.char.add(random_strings(rng, users, 5), "@gmail.com")
+    ages = rng.integers(12, 60, users)
+    products_df = catalog(rng, products)
+    stores_df = store_locations(rng, stores)
+    # each store prices every product within 15% of its base price
+    store_factor = rng.uniform(0.85, 1.15, (stores, 1))
+    prices = np.round(products_df['base_price'].to_numpy()[np.newaxis, :] * store_factor, -2)
+
+    user = np.concatenate([np.arange(min(users, rows)), rng.integers(0, users, max(rows - users, 0))])
+    rng.shuffle(user)
+    store = rng.integers(0, stores, rows)
+    # a few products make up most purchases
+    product = np.minimum(rng.zipf(1.3, rows) - 1, products - 1)
+    dates = np.datetime64('2024-01-01') + rng.integers(0, 366, rows).astype('timedelta64[D]')
+
+    df = pd.DataFrame({
+        'uid': uids[user],
+        'email': emails[user],
+        'age': ages[user].astype(float),
+        'product_name': products_df['product_name'].to_numpy()[product],
+        'product_type': products_df['product_type'].to_numpy()[product],
+        'quantity': np.minimum(rng.geometric(0.5, rows), 5),
+        'purchase_price': prices[store, product],
+        'purchase_date': np.datetime_as_string(dates, unit='D'),
+        'purchase_address': stores_df['purchase_address'].to_numpy()[store],
+        'long': stores_df['long'].to_numpy()[store],
+        'lat': stores_df['lat'].to_numpy()[store],
+    })
+    return df[COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="purchase_history.csv")
+    args = parser.parse_args()
+
+    df = purchase_history(args.users, args.rows, args.stores, products=args.products, seed=args.seed)
+    df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df)} rows for {args.users} users and {args.stores} stores to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Production server: gunicorn -c gunicorn.conf.py app:app
+#
+# The master imports the app once (preload_app) and forks the workers from it, so they share its
+# memory. TensorFlow is not fork-safe once it has run a model, so unless MODEL_SERVER=0 the model
+# runs in one separate model-server process (Object_Detection.utils.model_server) that the master
+# starts, and the workers send it images over a Unix socket. A thread in the master restarts the
+# model server whenever it exits, checking every MODEL_SERVER_CHECK_SECONDS; the workers reconnect
+# on their next request. With MODEL_SERVER=0 every worker loads its own model after the fork instead.
+#
+# The workers share the purchase history through a receipt log (RECEIPT_LOG_DIR, by default
+# receipt_log/ next to the dataset), so each one sees the receipts the others append and no two
+# of them append to the dataset csv at once.
+import os
+import sys
+import time
+import secrets
+import threading
+import subprocess
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+os.environ.setdefault("RECEIPT_LOG_DIR", os.path.join(
+    os.path.dirname(os.getenv("DATASET_PATH", "./recommender/dataset/purchase_history.csv")), "receipt_log"))
+
+MODEL_SERVER = os.getenv("MODEL_SERVER", "1") == "1"
+MODEL_SERVER_CHECK_SECONDS = float(os.getenv("MODEL_SERVER_CHECK_SECONDS", "2"))
+preload_app = MODEL_SERVER
+
+if MODEL_SERVER:
+    os.environ.setdefault("LOCALIZER_SOCKET", f"/tmp/localizer-{os.getpid()}.sock")
+    os.environ.setdefault("LOCALIZER_AUTHKEY", secrets.token_hex(16))
+
+model_server = None
+model_server_lock = threading.Lock()
+stopping = threading.Event()
+
+
+def start_model_server(server):
+    global model_server
+    with model_server_lock:
+        if stopping.is_set():
+            return
+        model_server = subprocess.Popen([sys.executable, "-m", "Object_Detection.utils.model_server"])
+    server.log.info("Started model server (pid %s) on %s", model_server.pid, os.environ["LOCALIZER_SOCKET"])
+
+
+def supervise_model_server(server):
+    """
+    Restarts the model server when it exits. One that keeps exiting within a minute of its restart
+    is restarted after a growing delay, up to a minute.
+    """
+    delay, restarted_at = 0.0, None
+    while not stopping.wait(MODEL_SERVER_CHECK_SECONDS):
+        code = model_server.poll()
+        if code is None:
+            continue
+        if restarted_at is not None and time.monotonic() - restarted_at < 60:
+            delay = min(max(delay * 2, MODEL_SERVER_CHECK_SECONDS), 60)
+        else:
+            delay = 0.0
+        server.log.error("Model server (pid %s) exited with code %s, restarting it in %.1fs",
+                         model_server.pid, code, delay)
+        if stopping.wait(delay):
+            return
+        start_model_server(server)
+        restarted_at = time.monotonic()
+
+
+def on_starting(server):
+    """
+    Starts the model server and the thread that restarts it. Workers wait for its socket on their
+    first request, and /ready answers 503 until it is up.
+    """
+    if MODEL_SERVER:
+        start_model_server(server)
+        threading.Thread(target=supervise_model_server, args=(server,), name="model-server-monitor",
+                         daemon=True).start()
+
+
+def on_exit(server):
+    with model_server_lock:
+        stopping.set()
+    if model_server is not None:
+        model_server.terminate()
+        model_server.wait(timeout=10)
@@ -1,33 +1,70 @@
 import warnings
+import requests
 import pandas as pd
 import re
-import json
-from Object_Detection.utils.object_localization import ocr_receipt  # Fixed import
-from Object_Detection.utils.vertex_extract_dict import extract_dict as ved
+from google.api_core import exceptions as google_exceptions
+from Object_Detection.utils.object_localization import object_localization, read_text
+from Object_Detection.utils.vertex_extract_dict import validate_user, parse_receipt, geocode_receipt, receipt_rows
+from Object_Detection.utils.llm_parser import LLMOutputError
+from Object_Detection.utils.ocr_pool import OCRPoolBusy
+from Object_Detection.utils.result_cache import image_digest
 from recommender.utils.product_recommender import recommend as pr
 from recommender.utils.cheap_close import cheap_proximity_rec as cc
+from recommender.utils.purchase_store import PurchaseHistoryStore, get_store
+from recommender.utils.recommendation_store import RecommendationStore
+from recommender.utils.pipeline import Pipeline, RetryPolicy, NO_RETRY
+from recommender.utils.metrics import observe_stage, cache_lookup, PIPELINE_STAGE_SECONDS, PIPELINE_STAGE_RETRIES
 
+# Retry policies of the pipeline stages. Localization, persisting and recommending are local and
+# deterministic, so they are not retried; the OCR queue, Gemini and the Geocoding API can fail transiently.
+OCR_RETRY = RetryPolicy(attempts=3, retry_on=(OCRPoolBusy,), backoff=0.5)
+EXTRACT_RETRY = RetryPolicy(attempts=4, backoff=1.0, retry_on=(
+    LLMOutputError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+))
+GEOCODE_RETRY = RetryPolicy(attempts=3, retry_on=(requests.RequestException,), backoff=0.5)
 
-def full_deployment(key_path: str, test_path: str, dataset_path: str, uid: str, email: str, model, lon: float, lat: float):
+
+def full_deployment(key_path: str, test_path: str, dataset_path, uid: str, email: str, model, lon: float, lat: float, max_km: float = None, k: int = None,
+                    precomputed: RecommendationStore = None, ocr_pool=None, cache=None, gazetteer=None,
+                    json_mode: bool = False, precomputed_max_age: float = 3600):
     """
     Takes a picture of a receipt, performs object localization for the receipt, uses OCR on cropped localized image,
     then generates recommended places to get similar items for cheaper and closer.
 
     Args:
       key_path (str): Path to the Google Cloud service account JSON key file.
-      test_path (str): Path to the image file of the receipt.
-      dataset_path (str): Path to the purchase history dataset.
+      test_path (str | bytes): Path to the image file of the receipt, or its contents.
+      dataset_path (str | PurchaseHistoryStore): Path to the purchase history dataset, or its in-memory store.
       uid (str): User ID.
       email (str): User email address.
       model (Any): The object detection model to be used for receipt localization.
       lon (float): User's longitude coordinate.
       lat (float): User's latitude coordinate.
+      max_km (float): Optional, only recommend stores within this many kilometers of the user.
+      k (int): Optional, only recommend the k nearest stores selling the recommended products.
+      precomputed (RecommendationStore): Optional store of recommendations written by recommender.precompute,
+                    used instead of running the recommender when it has an entry for the user.
+      ocr_pool (OCRPool): Optional worker pool to run tesseract in.
+      cache (ResultCache): Optional cache of localization, OCR and extraction results, so a re-uploaded
+                    receipt skips the model, tesseract and the Gemini call.
+      gazetteer (Gazetteer): Optional address -> coordinates lookup used instead of geocoding every receipt.
+      json_mode (bool): Ask Gemini for a JSON response instead of free text.
+      precomputed_max_age (float): Only use precomputed recommendations computed within this many seconds,
+                    so the receipt just added counts unless the user's entry is this recent. None accepts any age.
 
     Returns:
       pd.DataFrame: A dataframe sorted by distance from user's location, offering the cheapest price, 
                     at the most up-to-date of user's previously purchased items and recommended items based on RFM analysis.
     """
-    df = pd.read_csv(dataset_path)
+    if isinstance(dataset_path, PurchaseHistoryStore):
+        store = dataset_path
+    else:
+        store = get_store(dataset_path)
+    df = store.frame()
     
     if df.empty:
         raise ValueError("DataFrame is empty. Please check the dataset file in the provided path.")
@@ -40,28 +77,86 @@ def full_deployment(key_path: str, test_path: str, dataset_path: str, uid: str,
     if 'lat' not in df.columns:
         raise ValueError("lat column is missing from the dataset")
     
+    validate_user(uid, email)
     warnings.simplefilter(action='ignore', category=FutureWarning)
-    max_retries = 3  
-    for attempt in range(max_retries + 1):
-        try:
-            struk = ocr_receipt(test_path, model)  # Properly calls the imported function
-            data = ved(struk, key_path, uid, email)
-            data = pd.DataFrame(data)
-            break
-        except json.JSONDecodeError as e:
-            if attempt == max_retries:
-                raise
-            else:
-                print(f"JSONDecodeError encountered on attempt {attempt+1}. Retrying...")
-
-    df = pd.concat([df, data], ignore_index=True)
-    df.to_csv(dataset_path, index=False)
-    test_rec = pr(dataset_path, uid)
-    end_rec = cc(
-        dataset=dataset_path,
-        uid=uid,
-        product_list=test_rec,
-        lon=lon,
-        lat=lat
-    )
-    return end_rec
+    pipeline = receipt_pipeline(key_path, test_path, store, uid, email, model, lon, lat, max_km=max_km, k=k,
+                                precomputed=precomputed, ocr_pool=ocr_pool, cache=cache, gazetteer=gazetteer,
+                                json_mode=json_mode, precomputed_max_age=precomputed_max_age)
+    try:
+        return pipeline.run('recommend')
+    finally:
+        for stage, seconds in pipeline.timings.items():
+            observe_stage(stage, seconds, PIPELINE_STAGE_SECONDS)
+        for stage, attempts in pipeline.attempts.items():
+            if attempts > 1:
+                PIPELINE_STAGE_RETRIES.inc(attempts - 1, stage=stage)
+
+
+def receipt_pipeline(key_path: str, test_path, store: PurchaseHistoryStore, uid: str, email: str, model, lon: float,
+                     lat: float, max_km: float = None, k: int = None, precomputed: RecommendationStore = None,
+                     ocr_pool=None, cache=None, gazetteer=None, json_mode: bool = False,
+                     precomputed_max_age: float = 3600) -> Pipeline:
+    """
+    The stages of full_deployment for one receipt: localize -> ocr -> extract -> geocode -> persist -> recommend.
+
+    Each stage runs once and keeps its output, and retries with its own policy, so a bad Gemini
+    response only repeats the Gemini call, not the model and tesseract. With a cache, a known image
+    skips localize and ocr, and known OCR text skips the Gemini call. Arguments as in full_deployment.
+
+    Returns:
+      Pipeline: run('recommend') returns the recommendations; the other stages run on demand.
+    """
+    def digest(p):
+        return image_digest(test_path) if cache is not None else None
+
+    def localize(p):
+        return object_localization(test_path, model, cache=cache, digest=p['digest'])
+
+    def ocr(p):
+        if cache is not None:
+            text = cache.get(f"ocr:{p['digest']}")
+            cache_lookup("ocr", text is not None)
+            if text is not None:
+                return text
+        text = read_text(p['localize'], ocr_pool=ocr_pool)
+        if cache is not None:
+            cache.put(f"ocr:{p['digest']}", text)
+        return text
+
+    def extract(p):
+        return parse_receipt(p['ocr'], key_path, cache=cache, json_mode=json_mode)
+
+    def geocode(p):
+        return geocode_receipt(p['extract'], key_path, gazetteer=gazetteer)
+
+    def persist(p):
+        receipt_lat, receipt_long = p['geocode']
+        data = pd.DataFrame(receipt_rows(p['extract'], uid, email, receipt_lat, receipt_long))
+        store.append(data)
+        return data
+
+    def recommend(p):
+        p['persist']
+        #the receipt was just persisted, so an older precomputed list does not reflect it
+        test_rec = precomputed.get(uid, max_age=precomputed_max_age) if precomputed is not None else None
+        if test_rec is None:
+            test_rec = pr(store, uid)
+        end_rec = cc(
+            dataset=store,
+            uid=uid,
+            product_list=test_rec,
+            lon=lon,
+            lat=lat,
+            max_km=max_km,
+            k=k
+        )
+        return end_rec
+
+    return (Pipeline()
+            .stage('digest', digest)
+            .stage('localize', localize, NO_RETRY)
+            .stage('ocr', ocr, OCR_RETRY)
+            .stage('extract', extract, EXTRACT_RETRY)
+            .stage('geocode', geocode, GEOCODE_RETRY)
+            .stage('persist', persist, NO_RETRY)
+            .stage('recommend', recommend, NO_RETRY))
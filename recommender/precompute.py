@@ -0,0 +1,55 @@
+"""
+Offline job that precomputes product recommendations for every user (or a given list) and writes
+them to the local recommendation store read by /full-deployment.
+
+Meant to run nightly from cron, e.g.:
+    0 2 * * * cd /app && python -m recommender.precompute --output ./recommender/dataset/recommendations.db
+"""
+import os
+import time
+import argparse
+import warnings
+from recommender.utils.product_recommender import recommend_batch
+from recommender.utils.purchase_store import PurchaseHistoryStore
+from recommender.utils.recommendation_store import RecommendationStore
+
+
+def precompute(dataset_path: str, output_path: str, uids: list[str] = None, log_dir: str = None, num_recommendations: int = 8):
+    """
+    Computes recommendations in one batch pass and stores them.
+
+    Args:
+      dataset_path (str): Path to the purchase history dataset.
+      output_path (str): Path to the SQLite recommendation store.
+      uids (list[str]): Optional, only precompute these user ids.
+      log_dir (str): Optional receipt log directory, so receipts not yet compacted into the dataset are included.
+      num_recommendations (int): Number of products to recommend per user.
+
+    Returns:
+      int: the number of users written.
+    """
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+    store = PurchaseHistoryStore(dataset_path, log_dir=log_dir)
+    computed_at = time.time()
+    recommendations = recommend_batch(store, uids=uids, num_recommendations=num_recommendations)
+    RecommendationStore(output_path).write(recommendations, computed_at=computed_at)
+    return len(recommendations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=os.getenv("DATASET_PATH", "./recommender/dataset/purchase_history.csv"))
+    parser.add_argument("--output", default=os.getenv("RECOMMENDATIONS_DB", "./recommender/dataset/recommendations.db"))
+    parser.add_argument("--log-dir", default=os.getenv("RECEIPT_LOG_DIR"))
+    parser.add_argument("--uid", dest="uids", action="append", help="only precompute this uid (repeatable)")
+    parser.add_argument("--num-recommendations", type=int, default=8)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written = precompute(args.dataset, args.output, uids=args.uids, log_dir=args.log_dir,
+                         num_recommendations=args.num_recommendations)
+    print(f"Precomputed recommendations for {written} users in {time.perf_counter() - start:.2f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,26 @@
-from .cheap_close import cheap_proximity_rec
-from .product_recommender import recommend
+import importlib
 
-__all__ = ['cheap_proximity_rec', 'recommend']
+# name -> submodule, imported on first access (PEP 562) so importing one helper does not pull in
+# pandas, scipy and scikit-learn for all of them
+_EXPORTS = {
+    'cheap_proximity_rec': '.cheap_close',
+    'recommend': '.product_recommender',
+    'recommend_batch': '.product_recommender',
+    'PurchaseHistoryStore': '.purchase_store',
+    'get_store': '.purchase_store',
+    'RecommendationStore': '.recommendation_store',
+}
+
+__all__ = ['cheap_proximity_rec', 'recommend', 'recommend_batch', 'PurchaseHistoryStore', 'get_store', 'RecommendationStore']
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
 from math import radians, sin, cos, acos
-from geopy.distance import great_circle
+from .distance import great_circle_km
+from .purchase_store import resolve_store
+from .spatial_index import SpatialIndex
+from .metrics import timed
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float):
     """
@@ -41,23 +44,27 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float):
     
     return distance
 
-def cheap_proximity_rec(dataset: str, uid: str, product_list: list[str], lon: float, lat: float):
+@timed("cheap_proximity_rec")
+def cheap_proximity_rec(dataset, uid: str, product_list: list[str], lon: float, lat: float, max_km: float = None, k: int = None):
   """
   returns past purchased products and recommended products with cheaper price and in closer proximity to user
 
   Args:
-      dataset: Path to a (.csv) purchase_history file.
+      dataset: Path to a (.csv) purchase_history file, a PurchaseHistoryStore or a purchase_history dataframe.
       uid: user id.
       product_list: a list of recommended product (parsed from other util function that recommends product to user based on purchase history similarity).
       lon : longitude of user.
       lat : latitude of user.
+      max_km : optional, only consider stores within this many kilometers of the user.
+      k : optional, only consider the k nearest stores to the user selling the listed products.
 
   Returns:
       temp_df: a data frame of lately purchased product by user, and recommended based on similarity to user, sorted by the shortest distance (in kilometers), 
       latest date (up-to-date price), at the cheapest price.
   """
 
-  df = pd.read_csv(dataset)
+  store = resolve_store(dataset)
+  df = dataset if store is None else store.frame()
 
   """
   Initialization check
@@ -87,19 +94,31 @@ def cheap_proximity_rec(dataset: str, uid: str, product_list: list[str], lon: fl
   if lat<-90 or lat>90:
     raise ValueError("Latitude must be between -90 and 90")
 
-  df = pd.read_csv(dataset)
-
   """
   Recommend cheaper products at close proximity to user
   """
-  df = df[df['product_name'].isin(product_list)]
-
-  #calculate km distance to users
-  slong = radians(float(lon))
-  slat = radians(float(lat))
-  
-  #df['distance'] = df.apply(lambda row: haversine_distance(row['lat'], row['long'], slat, slong), axis=1)
-  df['distance'] = df.apply(lambda row: great_circle((row['lat'], row['long']), (lat, lon)).kilometers, axis=1)
+  if max_km is not None or k is not None:
+    #query the spatial index for the neighbourhood of the user only
+    index = SpatialIndex.from_frame(df) if store is None else store.spatial_index()
+    if k is None:
+      positions, distances = index.within(lat, lon, max_km, products=product_list)
+    else:
+      positions, distances = index.nearest(lat, lon, k, products=product_list, max_km=max_km)
+    in_snapshot = positions < len(df)
+    #back to dataset order, which recent_prod below is picked in, as in the full scan
+    order = np.argsort(positions[in_snapshot], kind='stable')
+    df = df.iloc[positions[in_snapshot][order]].copy()
+    df['distance'] = distances[in_snapshot][order]
+
+  else:
+    df = df[df['product_name'].isin(product_list)]
+
+    #calculate km distance to users
+    slong = radians(float(lon))
+    slat = radians(float(lat))
+
+    #df['distance'] = df.apply(lambda row: haversine_distance(row['lat'], row['long'], slat, slong), axis=1)
+    df['distance'] = great_circle_km(df['lat'], df['long'], lat, lon)
 
   count_trans = df[df['uid'] == uid].shape[0]
   if count_trans <= 5 and count_trans >= 1:
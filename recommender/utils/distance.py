@@ -0,0 +1,39 @@
+import numpy as np
+
+# Same mean earth radius as geopy.distance.great_circle, so distances match the geopy path
+EARTH_RADIUS_KM = 6371.009
+
+
+def great_circle_km(lats, lons, lat: float, lon: float) -> np.ndarray:
+    """
+    Great-circle distances from many points to one point, computed in a single NumPy pass.
+
+    Uses the same atan2 formulation as geopy.distance.great_circle, so the result is a drop-in
+    replacement for applying great_circle row by row. Rows with missing coordinates get NaN
+    instead of raising.
+
+    Args:
+        lats (array-like): Latitudes of the points in degrees.
+        lons (array-like): Longitudes of the points in degrees.
+        lat (float): Latitude of the reference point in degrees.
+        lon (float): Longitude of the reference point in degrees.
+
+    Returns:
+        numpy.ndarray: Distances in kilometers, one per point.
+    """
+    lat1 = np.radians(np.asarray(lats, dtype=np.float64))
+    lng1 = np.radians(np.asarray(lons, dtype=np.float64))
+    lat2 = np.radians(float(lat))
+    lng2 = np.radians(float(lon))
+
+    sin_lat1, cos_lat1 = np.sin(lat1), np.cos(lat1)
+    sin_lat2, cos_lat2 = np.sin(lat2), np.cos(lat2)
+
+    delta_lng = lng2 - lng1
+    cos_delta_lng, sin_delta_lng = np.cos(delta_lng), np.sin(delta_lng)
+
+    d = np.arctan2(np.sqrt((cos_lat2 * sin_delta_lng) ** 2 +
+                           (cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_delta_lng) ** 2),
+                   sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_delta_lng)
+
+    return EARTH_RADIUS_KM * d
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueueFull(RuntimeError):
+    """
+    Raised when too many jobs are already waiting to run.
+    """
+
+
+class JobStore:
+    """
+    SQLite table of background jobs: status, timestamps and the JSON result or error message.
+
+    Kept in a file so any worker process on the host can answer status polls for a job another
+    worker is running. Each job records the process running it, so fail_stale() can fail the jobs
+    of a process that exited before finishing them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, uid TEXT, status TEXT NOT NULL, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL, result TEXT, error TEXT, owner TEXT)"
+            )
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]
+            if "owner" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _execute(self, query: str, parameters: tuple):
+        with closing(self._connect()) as connection, connection:
+            connection.execute(query, parameters)
+
+    def create(self, uid: str = None) -> str:
+        """
+        Returns:
+            str: id of a new queued job.
+        """
+        job_id = uuid.uuid4().hex
+        self._execute("INSERT INTO jobs (id, uid, status, created_at, owner) VALUES (?, ?, ?, ?, ?)",
+                      (job_id, uid, QUEUED, time.time(), process_token()))
+        return job_id
+
+    def start(self, job_id: str):
+        self._execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, time.time(), job_id))
+
+    def finish(self, job_id: str, result):
+        """
+        Marks a job done with a JSON-serializable result.
+        """
+        self._execute("UPDATE jobs SET status = ?, finished_at = ?, result = ? WHERE id = ?",
+                      (DONE, time.time(), json.dumps(result), job_id))
+
+    def fail(self, job_id: str, error: str):
+        self._execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                      (FAILED, time.time(), error, job_id))
+
+    def get(self, job_id: str, with_result: bool = False):
+        """
+        Args:
+            job_id (str): job id.
+            with_result (bool): also load and decode the result.
+
+        Returns:
+            dict | None: id, uid, status, created_at, started_at, finished_at, error (and result),
+                or None if there is no such job.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT id, uid, status, created_at, started_at, finished_at, error, "
+                + ("result" if with_result else "NULL") + " FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(["id", "uid", "status", "created_at", "started_at", "finished_at", "error"], row[:7]))
+        if with_result:
+            job["result"] = json.loads(row[7]) if row[7] is not None else None
+        return job
+
+    def prune(self, max_age: float):
+        """
+        Deletes finished jobs older than `max_age` seconds.
+        """
+        self._execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                      (DONE, FAILED, time.time() - max_age))
+
+    def fail_stale(self, max_age: float = None) -> int:
+        """
+        Fails the queued and running jobs that can no longer finish: those whose process has exited,
+        and those created more than `max_age` seconds ago.
+
+        Returns:
+            int: number of jobs failed.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            rows = connection.execute("SELECT id, owner, created_at FROM jobs WHERE status IN (?, ?)",
+                                      (QUEUED, RUNNING)).fetchall()
+            stale = []
+            for job_id, owner, created_at in rows:
+                if owner is None or not process_alive(owner):
+                    error = "Job was interrupted: its worker process exited"
+                elif max_age is not None and created_at < now - max_age:
+                    error = f"Job did not finish within {max_age:g} seconds"
+                else:
+                    continue
+                stale.append((FAILED, now, error, job_id, QUEUED, RUNNING))
+            connection.executemany("UPDATE jobs SET status = ?, finished_at = ?, error = ? "
+                                   "WHERE id = ? AND status IN (?, ?)", stale)
+        return len(stale)
+
+
+def process_token(pid: int = None) -> str:
+    """
+    Identifies a process on this host: its pid and, where /proc is available, its start time, so
+    a process that later reuses the pid (say after a container restart) does not match.
+    """
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # starttime is the 22nd field; the command name (field 2) may contain spaces
+            return f"{pid}:{f.read().rsplit(')', 1)[1].split()[19]}"
+    except (OSError, IndexError):
+        return str(pid)
+
+
+def process_alive(owner: str) -> bool:
+    """
+    Whether the process identified by a process_token() is still running.
+    """
+    pid = int(owner.split(":", 1)[0])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return ":" not in owner or process_token(pid) == owner
+
+
+class JobQueue:
+    """
+    Runs jobs on a pool of `max_workers` background threads and records them in a JobStore.
+
+    submit() returns a job id immediately; the caller polls the store for the status and result.
+    At most `max_pending` jobs are queued or running in this process, beyond that submit() raises
+    JobQueueFull. Finished jobs are deleted after `retention` seconds.
+
+    Jobs left queued or running by a process that exited, or older than `stale_after` seconds, are
+    failed when the queue is created and whenever this process runs out of jobs, so their status
+    polls end.
+    """
+
+    def __init__(self, store: JobStore, max_workers: int = 2, max_pending: int = 32, retention: float = 86400,
+                 stale_after: float = 3600):
+        self.store = store
+        self.max_pending = max_pending
+        self.retention = retention
+        self.stale_after = stale_after
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.sweep()
+
+    def sweep(self):
+        """
+        Fails stale jobs and deletes the expired finished ones.
+        """
+        failed = self.store.fail_stale(self.stale_after)
+        if failed:
+            print(f"Failed {failed} stale jobs")
+        self.store.prune(self.retention)
+
+    def submit(self, uid: str, fn, /, *args, **kwargs) -> str:
+        """
+        Queues fn(*args, **kwargs), whose return value must be JSON-serializable.
+
+        Args:
+            uid (str): owner of the job.
+            fn (callable): the job.
+
+        Returns:
+            str: the job id.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} jobs pending)")
+            self._pending += 1
+        try:
+            job_id = self.store.create(uid)
+            self._executor.submit(self._run, job_id, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        try:
+            self.store.start(job_id)
+            result = fn(*args, **kwargs)
+            self.store.finish(job_id, result)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.fail(job_id, str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                prune = self._pending == 0
+            if prune:
+                self.sweep()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
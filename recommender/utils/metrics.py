@@ -0,0 +1,287 @@
+import time
+import threading
+import contextvars
+from contextlib import ContextDecorator
+
+# seconds, from a cache hit to a slow Gemini call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    A named metric with one value per combination of label values.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labelnames) or 'none'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(self._labels_text(key), value) for key, value in sorted(self._values.items())]
+
+    def _labels_text(self, key) -> str:
+        return _labels(self.labelnames, key)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{labels} {_number(value)}" for labels, value in self._samples()]
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. With `function`, the value is read from function() (which may
+    return a {label values tuple: value} dict for labelled gauges) each time the metrics are rendered.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        if self.function is None:
+            return super()._samples()
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {e}")
+            return []
+        if value is None:
+            return []
+        values = value if isinstance(value, dict) else {(): value}
+        return [(self._labels_text(key), value) for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    """
+    Counts observations into cumulative `buckets`, and keeps their sum and count.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of a process, rendered in the Prometheus text exposition format.
+
+    Each worker process keeps its own metrics, so under gunicorn /metrics reports the worker that
+    answered it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=(), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function=function))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "receipt_stage_seconds",
+    "Duration of the steps of reading a receipt and recommending (decode, inference, tesseract, gemini, ...).",
+    ["stage"])
+PIPELINE_STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_seconds", "Duration of the full_deployment pipeline stages, retries included.", ["stage"])
+PIPELINE_STAGE_RETRIES = REGISTRY.counter(
+    "pipeline_stage_retries_total", "Retries of full_deployment pipeline stages.", ["stage"])
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"])
+
+
+def cache_hit_ratios() -> dict:
+    """
+    Returns:
+        dict: {(cache,): share of the lookups of the cache that were hits}.
+    """
+    with CACHE_REQUESTS._lock:
+        values = dict(CACHE_REQUESTS._values)
+    ratios = {}
+    for cache in {cache for cache, _ in values}:
+        hits, misses = values.get((cache, "hit"), 0), values.get((cache, "miss"), 0)
+        ratios[(cache,)] = hits / (hits + misses)
+    return ratios
+
+
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "cache_hit_ratio", "Share of the cache lookups that were hits, since the process started.", ["cache"],
+    function=cache_hit_ratios)
+
+
+class Trace:
+    """
+    The stage durations of one request, reported back in a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def add(self, name: str, seconds: float):
+        self.spans.append((name, seconds))
+
+    def server_timing(self) -> str:
+        """
+        Returns:
+            str: the spans as a Server-Timing header value, e.g. "decode;dur=12.3, inference;dur=40.1".
+        """
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans)
+
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace():
+    """
+    Starts collecting the stage durations of the current request (thread or context).
+
+    Returns:
+        tuple(Trace, contextvars.Token): the trace, and the token to pass to end_trace.
+    """
+    trace = Trace()
+    return trace, _trace.set(trace)
+
+
+def end_trace(token):
+    _trace.reset(token)
+
+
+def current_trace():
+    return _trace.get()
+
+
+def observe_stage(stage: str, seconds: float, histogram: Histogram = STAGE_SECONDS):
+    """
+    Records the duration of a stage in `histogram` and in the current trace, if any.
+    """
+    histogram.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+class timed(ContextDecorator):
+    """
+    Times a block (`with timed("tesseract"):`) or every call of a function (`@timed("recommend")`)
+    as a stage, see observe_stage. Failed calls are timed too.
+    """
+
+    def __init__(self, stage: str, histogram: Histogram = STAGE_SECONDS):
+        self.stage = stage
+        self.histogram = histogram
+        self._local = threading.local()
+
+    def __enter__(self):
+        starts = getattr(self._local, "starts", None)
+        if starts is None:
+            starts = self._local.starts = []
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.stage, time.perf_counter() - self._local.starts.pop(), self.histogram)
+        return False
+
+
+def cache_lookup(cache: str, hit: bool):
+    """
+    Counts a hit or miss of a cache, see CACHE_REQUESTS.
+    """
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,99 @@
+import time
+import random
+
+
+class RetryPolicy:
+    """
+    How often a pipeline stage is attempted, on which errors it is retried, and how long to wait
+    between attempts.
+
+    The wait before retry n (1-based) is `backoff * multiplier ** (n - 1)` seconds, capped at
+    `max_backoff`, and scaled by a random factor in [0.5, 1] when `jitter` is set so concurrent
+    requests do not retry in lockstep.
+    """
+
+    def __init__(self, attempts: int = 1, retry_on: tuple = (), backoff: float = 0.0, multiplier: float = 2.0,
+                 max_backoff: float = 10.0, jitter: bool = True):
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        self.attempts = attempts
+        self.retry_on = tuple(retry_on)
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def delay(self, retry: int) -> float:
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (retry - 1))
+        return delay * random.uniform(0.5, 1.0) if self.jitter else delay
+
+
+NO_RETRY = RetryPolicy()
+
+
+class Pipeline:
+    """
+    Named stages of one request, each run at most once and memoized.
+
+    A stage is a function of the pipeline, so it can ask for the outputs of the stages it depends
+    on with pipeline[name]; those run on first use. A failing stage is retried according to its
+    own RetryPolicy, without re-running the stages whose outputs it already has. Stage durations,
+    including retries but excluding the stages they pulled in, are kept in `timings`.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self.results = {}
+        self.timings = {}
+        self.attempts = {}
+        self._nested = 0.0
+
+    def stage(self, name: str, fn, policy: RetryPolicy = NO_RETRY):
+        """
+        Adds a stage.
+
+        Args:
+            name (str): stage name.
+            fn (callable): fn(pipeline) -> stage output.
+            policy (RetryPolicy): retry policy of the stage.
+        """
+        self._stages[name] = (fn, policy)
+        return self
+
+    def run(self, name: str):
+        """
+        Returns the output of a stage, running it (and the stages it needs) if it has not run yet.
+        """
+        if name in self.results:
+            return self.results[name]
+        if name not in self._stages:
+            raise ValueError(f"Unknown pipeline stage: {name}")
+        fn, policy = self._stages[name]
+
+        outer, self._nested = self._nested, 0.0
+        start = time.perf_counter()
+        try:
+            for attempt in range(1, policy.attempts + 1):
+                self.attempts[name] = attempt
+                try:
+                    result = fn(self)
+                    break
+                except policy.retry_on as e:
+                    if attempt == policy.attempts:
+                        raise
+                    delay = policy.delay(attempt)
+                    print(f"Stage {name} failed on attempt {attempt} ({type(e).__name__}: {e}). "
+                          f"Retrying in {delay:.2f}s...")
+                    time.sleep(delay)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed - self._nested
+            self._nested = outer + elapsed
+        self.results[name] = result
+        return result
+
+    def __getitem__(self, name):
+        return self.run(name)
+
+    def __contains__(self, name):
+        return name in self.results
@@ -0,0 +1,267 @@
+import os
+import threading
+import pandas as pd
+from .receipt_log import ReceiptLog
+from .spatial_index import SpatialIndex
+from .rfm import RFMTable
+from .user_profiles import UserProfileIndex
+from .metrics import timed
+
+COLUMNS = ['uid', 'email', 'age', 'product_name', 'product_type', 'quantity',
+           'purchase_price', 'purchase_date', 'purchase_address', 'long', 'lat']
+
+REQUIRED_COLUMNS = ['uid', 'product_name', 'product_type', 'purchase_date',
+                    'purchase_price', 'long', 'lat']
+
+NUMERIC_COLUMNS = ['age', 'quantity', 'purchase_price', 'long', 'lat']
+
+
+def validate_columns(df: pd.DataFrame, columns=REQUIRED_COLUMNS):
+    """
+    Raises a ValueError naming the first column missing from a purchase_history frame.
+
+    Args:
+        df (pd.DataFrame): purchase_history rows.
+        columns (list[str]): columns that must be present.
+    """
+    if df.empty:
+        raise ValueError("DataFrame is empty. Please check the dataset file.")
+    for column in columns:
+        if column not in df.columns:
+            raise ValueError(f"{column} column is missing from the dataset")
+
+
+def coerce_rows(rows, columns=COLUMNS) -> pd.DataFrame:
+    """
+    Converts receipt rows (a dict of lists, as returned by extract_dict, or a dataframe)
+    into the purchase_history column layout with numeric columns typed and purchase dates
+    normalized to YYYY-MM-DD.
+
+    Args:
+        rows (dict | pd.DataFrame): new purchase rows.
+        columns (list[str]): column order of the target dataset.
+
+    Returns:
+        pd.DataFrame: rows ordered by `columns`, missing columns filled with NaN.
+
+    Raises:
+        ValueError: if a purchase_date is not an ISO 8601 date.
+    """
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    df = df.reindex(columns=columns)
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    if 'purchase_date' in df.columns:
+        df['purchase_date'] = normalize_dates(df['purchase_date'])
+    return df
+
+
+def normalize_dates(dates: pd.Series) -> pd.Series:
+    """
+    Formats ISO 8601 dates (or datetimes) as YYYY-MM-DD, the format the dataset and RFMTable use.
+    Missing dates stay missing.
+
+    Raises:
+        ValueError: naming the first value that is not an ISO 8601 date.
+    """
+    try:
+        parsed = pd.to_datetime(dates, format='ISO8601', errors='coerce')
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"purchase_date must be an ISO 8601 date: {e}")
+    invalid = parsed.isna() & dates.notna()
+    if invalid.any():
+        raise ValueError(f"purchase_date must be an ISO 8601 date, got {dates[invalid].iloc[0]!r}")
+    return parsed.dt.strftime('%Y-%m-%d').where(parsed.notna(), None)
+
+
+class PurchaseHistoryStore:
+    """
+    Process-resident copy of the purchase_history dataset.
+
+    The csv is parsed once; new receipt rows are appended to memory and persisted without
+    rewriting the file. Without a log_dir the rows are appended to the end of the csv; with a
+    log_dir they go to a ReceiptLog, which is safe to share between worker processes, and each
+    store picks up the rows other workers appended on its next frame() call.
+
+    frame() returns the current snapshot, which callers must treat as read-only (appends replace
+    the snapshot rather than mutating it). Structures derived from the frame, such as the spatial
+    index, are registered with derived() and kept current as rows are appended.
+    """
+
+    def __init__(self, dataset_path: str, log_dir: str = None):
+        self.dataset_path = dataset_path
+        self.log = ReceiptLog(log_dir, dataset_path) if log_dir else None
+        self._lock = threading.RLock()
+        self._frame = None
+        self._cursor = None
+        self._derived = {}
+
+    def load(self):
+        """
+        (Re)reads the dataset from disk, replacing the in-memory snapshot.
+        """
+        with self._lock, timed("dataset_load"):
+            if self.log is None:
+                df = pd.read_csv(self.dataset_path)
+            else:
+                df, self._cursor = self.log.read_all()
+            validate_columns(df)
+            self._frame = df
+            self._derived.clear()
+        return df
+
+    def _extend(self, new_rows: pd.DataFrame):
+        start = len(self._frame)
+        new_rows = new_rows.set_axis(range(start, start + len(new_rows)))
+        self._frame = pd.concat([self._frame, new_rows])
+        for name, structure in self._derived.items():
+            try:
+                structure.extend(new_rows, start)
+            except Exception as e:
+                # the rows are already persisted and in the frame, so rather than fail the append
+                # with some structures updated and others not, all of them are rebuilt on next use
+                print(f"Error extending {name} with {len(new_rows)} rows, rebuilding derived structures: {e}")
+                self._derived.clear()
+                return
+
+    def refresh(self):
+        """
+        Brings the snapshot up to date with rows other processes appended to the receipt log.
+        """
+        with self._lock:
+            if self._frame is None:
+                return self.load()
+            if self.log is None:
+                return self._frame
+            new_rows, cursor = self.log.read_since(self._cursor, list(self._frame.columns))
+            if cursor is None:
+                return self.load()
+            if new_rows is not None:
+                try:
+                    new_rows = coerce_rows(new_rows, self._frame.columns)
+                except ValueError as e:
+                    print(f"Invalid rows in the receipt log, reloading the dataset: {e}")
+                    return self.load()
+                self._extend(new_rows)
+            self._cursor = cursor
+            return self._frame
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: the current purchase_history snapshot, loaded on first use.
+        """
+        return self.refresh()
+
+    def append(self, rows) -> pd.DataFrame:
+        """
+        Appends new purchase rows to the store and persists only those rows.
+
+        Args:
+            rows (dict | pd.DataFrame): new purchase rows.
+
+        Returns:
+            pd.DataFrame: the appended rows, typed and in column order.
+        """
+        with self._lock:
+            frame = self.frame()
+            new_rows = coerce_rows(rows, frame.columns)
+            with timed("dataset_append"):
+                if self.log is None:
+                    new_rows.to_csv(self.dataset_path, mode='a', header=False, index=False)
+                    self._extend(new_rows)
+                else:
+                    self.log.append(new_rows)
+                    self.refresh()
+        return new_rows
+
+    def derived(self, name: str, build):
+        """
+        Returns a structure derived from the purchase history, building it on first use.
+
+        Args:
+            name (str): key of the structure.
+            build (callable): build(frame) -> structure. The structure must provide
+                extend(rows, start), which is called with every batch of appended rows and the
+                row position of the first of them.
+        """
+        with self._lock:
+            frame = self.frame()
+            if name not in self._derived:
+                with timed(f"build_{name}"):
+                    self._derived[name] = build(frame)
+            return self._derived[name]
+
+    def spatial_index(self) -> SpatialIndex:
+        """
+        Returns:
+            SpatialIndex: grid index over the store coordinates, keyed by row position in frame().
+        """
+        return self.derived('spatial_index', SpatialIndex.from_frame)
+
+    def rfm(self) -> RFMTable:
+        """
+        Returns:
+            RFMTable: per-uid recency, frequency and monetary aggregates of the purchase history.
+        """
+        return self.derived('rfm', RFMTable.from_frame)
+
+    def profiles(self) -> UserProfileIndex:
+        """
+        Returns:
+            UserProfileIndex: TF-IDF product type profiles of every uid in the purchase history.
+        """
+        return self.derived('profiles', UserProfileIndex.from_frame)
+
+    def __len__(self):
+        return len(self.frame())
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(dataset_path: str, log_dir: str = None) -> PurchaseHistoryStore:
+    """
+    Returns the process-wide store for a dataset path, creating it on first use.
+
+    Args:
+        dataset_path (str): Path to a (.csv) purchase_history file.
+        log_dir (str): Directory of the receipt log to persist appends to. Only used when the
+            store is created; later calls may omit it.
+    """
+    key = os.path.abspath(dataset_path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = PurchaseHistoryStore(dataset_path, log_dir=log_dir)
+        store = _stores[key]
+    if log_dir and (store.log is None or os.path.abspath(store.log.log_dir) != os.path.abspath(log_dir)):
+        raise ValueError(f"Store for {dataset_path} was already created with a different receipt log")
+    return store
+
+
+def resolve_store(dataset):
+    """
+    Returns the store behind a dataset argument, or None for a plain dataframe.
+    """
+    if isinstance(dataset, PurchaseHistoryStore):
+        return dataset
+    if isinstance(dataset, pd.DataFrame):
+        return None
+    return get_store(dataset)
+
+
+def load_dataset(dataset) -> pd.DataFrame:
+    """
+    Resolves the dataset argument accepted by the recommender utilities.
+
+    Args:
+        dataset (str | pd.DataFrame | PurchaseHistoryStore): a path to a (.csv) purchase_history
+            file (served from the shared store), a store, or an already loaded dataframe.
+
+    Returns:
+        pd.DataFrame: purchase_history rows, to be treated as read-only.
+    """
+    store = resolve_store(dataset)
+    return dataset if store is None else store.frame()
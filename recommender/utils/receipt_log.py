@@ -0,0 +1,246 @@
+import io
+import os
+import json
+import re
+import fcntl
+import threading
+import pandas as pd
+from contextlib import contextmanager
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{6})\.csv$")
+MANIFEST_NAME = "MANIFEST"
+LOCK_NAME = ".lock"
+
+
+class ReceiptLog:
+    """
+    Append-only, segmented log of receipt rows kept next to the base purchase_history csv.
+
+    Every append writes only the new rows to the active segment file, so write cost depends on
+    the receipt size rather than on the history size. All writers and readers take an flock on
+    a shared lock file, which makes the log safe for several worker processes. compact() folds
+    the segments into the base csv; MANIFEST records the last segment number folded in (the
+    generation) and the row count of the base csv. Segments at or below the generation are
+    already in the base and are skipped. A reader whose cursor predates a compaction moves it to
+    the new generation, picking up from the base only the rows it had not seen.
+
+    compact() writes MANIFEST with the new state marked pending before it replaces the base csv,
+    and commits it afterwards. If the process dies in between, the row count of the base csv on
+    disk tells which of the two states it holds, so no row is lost or read twice.
+    """
+
+    def __init__(self, log_dir: str, dataset_path: str, segment_bytes: int = 1 << 20):
+        self.log_dir = log_dir
+        self.dataset_path = dataset_path
+        self.segment_bytes = segment_bytes
+        os.makedirs(log_dir, exist_ok=True)
+        self._compactor = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with open(os.path.join(self.log_dir, LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.log_dir, f"segment-{number:06d}.csv")
+
+    def _segments(self) -> list[int]:
+        numbers = []
+        for name in os.listdir(self.log_dir):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _manifest(self) -> dict:
+        # {"generation": int, "base_rows": int | None}, plus "next" (the state compact() is
+        # switching to) while a compaction is underway or was interrupted
+        try:
+            with open(os.path.join(self.log_dir, MANIFEST_NAME)) as manifest:
+                text = manifest.read().strip()
+        except FileNotFoundError:
+            text = ""
+        if not text.startswith("{"):
+            # no compaction yet, or a MANIFEST holding only the generation
+            return {"generation": int(text or 0), "base_rows": None}
+        return json.loads(text)
+
+    def _write_manifest(self, state: dict):
+        manifest_path = os.path.join(self.log_dir, MANIFEST_NAME)
+        with open(f"{manifest_path}.tmp", "w") as manifest:
+            json.dump(state, manifest)
+            manifest.flush()
+            os.fsync(manifest.fileno())
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    @staticmethod
+    def _committed(manifest: dict, base_rows: int) -> dict:
+        # the state the base csv on disk belongs to
+        pending = manifest.get("next")
+        if pending is not None and pending["base_rows"] == base_rows:
+            return pending
+        return {"generation": manifest["generation"], "base_rows": base_rows}
+
+    def _recover(self):
+        # must hold the exclusive lock; settles an interrupted compaction and drops folded segments
+        manifest = self._manifest()
+        if "next" in manifest:
+            manifest = self._committed(manifest, len(pd.read_csv(self.dataset_path)))
+            self._write_manifest(manifest)
+        for number in self._segments():
+            if number <= manifest["generation"]:
+                os.remove(self._segment_path(number))
+        return manifest
+
+    def _read_segment(self, number: int, offset: int, columns: list[str]):
+        with open(self._segment_path(number), "rb") as segment:
+            segment.seek(offset)
+            raw = segment.read()
+        if not raw:
+            return None, offset
+        rows = pd.read_csv(io.BytesIO(raw), header=None, names=columns)
+        return rows, offset + len(raw)
+
+    def append(self, rows: pd.DataFrame):
+        """
+        Appends rows to the active segment, starting a new segment once it reaches segment_bytes.
+
+        Args:
+            rows (pd.DataFrame): rows already in the purchase_history column order.
+        """
+        payload = rows.to_csv(header=False, index=False).encode()
+        with self._locked(exclusive=True):
+            generation = self._recover()["generation"]
+            segments = self._segments()
+            number = segments[-1] if segments else generation + 1
+            path = self._segment_path(number)
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+                number += 1
+                path = self._segment_path(number)
+            with open(path, "ab") as segment:
+                segment.write(payload)
+                segment.flush()
+                os.fsync(segment.fileno())
+
+    def read_all(self):
+        """
+        Reads the base csv plus every segment.
+
+        Returns:
+            tuple(pd.DataFrame, tuple): the full purchase history and a cursor for read_since().
+        """
+        with self._locked(exclusive=False):
+            base = pd.read_csv(self.dataset_path)
+            parts = [base]
+            generation = self._committed(self._manifest(), len(base))["generation"]
+            cursor = (generation, 0, 0, len(base))
+            for number in self._segments():
+                if number <= generation:
+                    continue
+                rows, offset = self._read_segment(number, 0, list(base.columns))
+                if rows is not None:
+                    parts.append(rows)
+                cursor = (generation, number, offset, cursor[3] + (len(rows) if rows is not None else 0))
+        frame = pd.concat(parts, ignore_index=True) if len(parts) > 1 else base
+        return frame, cursor
+
+    def read_since(self, cursor: tuple, columns: list[str]):
+        """
+        Reads the rows appended after a cursor returned by read_all() or read_since().
+
+        Args:
+            cursor (tuple): (generation, segment number, byte offset, rows read).
+            columns (list[str]): column names of the base csv.
+
+        Returns:
+            tuple(pd.DataFrame | None, tuple | None): the new rows and the advanced cursor, or
+                (None, None) when the log cannot tell which rows are new (after an interrupted
+                compaction) and a full read is needed.
+        """
+        generation, last_number, last_offset, seen = cursor
+        parts = []
+        with self._locked(exclusive=False):
+            manifest = self._manifest()
+            if manifest["generation"] != generation:
+                base_rows = manifest["base_rows"]
+                if "next" in manifest or base_rows is None or base_rows < seen:
+                    return None, None
+                if base_rows > seen:
+                    # rows of the folded segments this reader had not read yet
+                    parts.append(pd.read_csv(self.dataset_path).iloc[seen:base_rows])
+                generation, last_number, last_offset, seen = manifest["generation"], 0, 0, base_rows
+                cursor = (generation, last_number, last_offset, seen)
+            for number in self._segments():
+                if number <= generation or number < last_number:
+                    continue
+                offset = last_offset if number == last_number else 0
+                rows, offset = self._read_segment(number, offset, columns)
+                if rows is not None:
+                    parts.append(rows)
+                    seen += len(rows)
+                cursor = (generation, number, offset, seen)
+        new_rows = pd.concat(parts, ignore_index=True) if parts else None
+        return new_rows, cursor
+
+    def compact(self) -> int:
+        """
+        Folds every segment into the base csv, replacing it atomically.
+
+        Returns:
+            int: the number of segments compacted.
+        """
+        with self._locked(exclusive=True):
+            generation = self._recover()["generation"]
+            segments = [number for number in self._segments() if number > generation]
+            if not segments:
+                return 0
+            base = pd.read_csv(self.dataset_path)
+            parts = [base]
+            for number in segments:
+                rows, _ = self._read_segment(number, 0, list(base.columns))
+                if rows is not None:
+                    parts.append(rows)
+            compacted = pd.concat(parts, ignore_index=True)
+            committed = {"generation": segments[-1], "base_rows": len(compacted)}
+            self._write_manifest({"generation": generation, "base_rows": len(base), "next": committed})
+
+            tmp_path = f"{self.dataset_path}.compacting"
+            with open(tmp_path, "w", newline="") as tmp_file:
+                compacted.to_csv(tmp_file, index=False)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, self.dataset_path)
+
+            self._write_manifest(committed)
+            for number in segments:
+                os.remove(self._segment_path(number))
+        return len(segments)
+
+    def start_compactor(self, interval: float) -> threading.Thread:
+        """
+        Starts a daemon thread that runs compact() every `interval` seconds.
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            return self._compactor
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    compacted = self.compact()
+                    if compacted:
+                        print(f"Compacted {compacted} receipt log segment(s) into {self.dataset_path}")
+                except Exception as e:
+                    print(f"Error during receipt log compaction: {e}")
+
+        self._stop.clear()
+        self._compactor = threading.Thread(target=run, name="receipt-log-compactor", daemon=True)
+        self._compactor.start()
+        return self._compactor
+
+    def stop_compactor(self):
+        self._stop.set()
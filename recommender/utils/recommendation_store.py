@@ -0,0 +1,56 @@
+import json
+import time
+import sqlite3
+from contextlib import closing
+
+
+class RecommendationStore:
+    """
+    Local SQLite table of precomputed product recommendations, one row per uid.
+
+    Written by the offline precompute job (python -m recommender.precompute) and read by
+    /full-deployment, so most requests skip the recommender entirely.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations ("
+                "uid TEXT PRIMARY KEY, products TEXT NOT NULL, computed_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def write(self, recommendations: dict, computed_at: float = None):
+        """
+        Replaces the stored recommendations of the given uids in one transaction.
+
+        Args:
+            recommendations (dict): uid -> list of product names.
+            computed_at (float): unix time of the computation, defaults to now.
+        """
+        computed_at = time.time() if computed_at is None else computed_at
+        rows = [(uid, json.dumps(products), computed_at) for uid, products in recommendations.items()]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO recommendations (uid, products, computed_at) VALUES (?, ?, ?)", rows
+            )
+
+    def get(self, uid: str, max_age: float = None):
+        """
+        Args:
+            uid (str): user id.
+            max_age (float): ignore recommendations computed more than this many seconds ago.
+
+        Returns:
+            list | None: the stored product names, or None if there are none (fresh enough).
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT products, computed_at FROM recommendations WHERE uid = ?", (uid,)
+            ).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return json.loads(row[0])
@@ -0,0 +1,186 @@
+import time
+import threading
+import numpy as np
+import pandas as pd
+from .metrics import timed
+
+# RFM score -> customer segment, applied in this order so later segments win like the original .loc chain
+SEGMENT_SCORES = [
+    ('Premium Customer', ['334', '443', '444', '344', '434', '433', '343', '333']), #nothing <= 2
+    ('Repeat Customer', ['244', '234', '232', '332', '143', '233', '243']), # f >= 3 & r or m >=3
+    ('Top Spender', ['424', '414', '144', '314', '324', '124', '224', '423', '413', '133', '323', '313', '134']), # m >= 3 & f or m >=3
+    ('At Risk Customer', ['422', '223', '212', '122', '222', '132', '322', '312', '412', '123', '214']), # two or more  <=2
+    ('Inactive Customer', ['411', '111', '113', '114', '112', '211', '311']), # two or more  =1
+]
+SEGMENTS = {score: segment for segment, scores in SEGMENT_SCORES for score in scores}
+
+
+def quartile_edges(values: np.ndarray) -> np.ndarray:
+    """
+    Inner quartile edges (25th, 50th and 75th percentile), as used by pd.qcut(q=4).
+    """
+    return np.quantile(values, [0.25, 0.5, 0.75])
+
+
+def quartile_labels(values, edges: np.ndarray) -> np.ndarray:
+    """
+    Quartile label 1-4 of each value, with the right-closed bins of pd.qcut.
+    """
+    return np.searchsorted(edges, values, side='left') + 1
+
+
+class RFMTable:
+    """
+    Per-uid recency, frequency and monetary aggregates, maintained incrementally as receipts arrive.
+
+    Appends only touch the aggregates of the uids on the new rows. The quartile cutoffs are
+    recomputed once `refresh_rows` rows have changed or `refresh_seconds` have passed, so scoring
+    a customer is a dictionary lookup plus three binary searches. Recency quartiles are taken
+    against the latest purchase date at the time of the last cutoff refresh.
+    """
+
+    def __init__(self, refresh_rows: int = 1000, refresh_seconds: float = 3600):
+        self.refresh_rows = refresh_rows
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._last_purchase = {}
+        self._frequency = {}
+        self._monetary = {}
+        self._now = None
+        self._changed = 0
+        self._cutoffs = None
+        self._cutoffs_now = None
+        self._refreshed_at = 0.0
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs):
+        """
+        Builds the aggregates from a purchase_history frame.
+        """
+        table = cls(**kwargs)
+        table.extend(df, 0)
+        return table
+
+    def extend(self, rows: pd.DataFrame, start: int = 0):
+        """
+        Folds new purchase rows into the aggregates.
+
+        Args:
+            rows (pd.DataFrame): rows with uid, purchase_date, product_name and purchase_price columns.
+            start (int): row position of the first of `rows`, unused but part of the store's derived
+                structure interface.
+        """
+        rows = rows[rows['uid'].notna()]
+        if rows.empty:
+            return
+        dates = pd.to_datetime(rows['purchase_date'], format='%Y-%m-%d')
+        grouped = pd.DataFrame({'uid': rows['uid'].to_numpy(), 'purchase_date': dates.to_numpy(),
+                                'purchase_price': rows['purchase_price'].to_numpy()}).groupby('uid')
+        last_purchase = grouped['purchase_date'].max()
+        frequency = grouped.size()
+        monetary = grouped['purchase_price'].sum()
+
+        with self._lock:
+            for uid, last in last_purchase.items():
+                previous = self._last_purchase.get(uid)
+                self._last_purchase[uid] = last if previous is None or last > previous else previous
+                self._frequency[uid] = self._frequency.get(uid, 0) + int(frequency[uid])
+                self._monetary[uid] = self._monetary.get(uid, 0.0) + float(monetary[uid])
+            latest = last_purchase.max()
+            if self._now is None or latest > self._now:
+                self._now = latest
+            self._changed += len(rows)
+
+    def _refresh_cutoffs(self, force: bool = False):
+        stale = (self._cutoffs is None or self._changed >= self.refresh_rows
+                 or time.monotonic() - self._refreshed_at >= self.refresh_seconds)
+        if not (force or stale):
+            return
+        with timed("rfm_cutoffs"):
+            self._compute_cutoffs()
+
+    def _compute_cutoffs(self):
+        uids = list(self._last_purchase)
+        last = pd.DatetimeIndex([self._last_purchase[uid] for uid in uids])
+        recency = (self._now - last).days.to_numpy()
+        frequency = np.fromiter((self._frequency[uid] for uid in uids), dtype=np.int64, count=len(uids))
+        monetary = np.fromiter((self._monetary[uid] for uid in uids), dtype=np.float64, count=len(uids))
+        self._cutoffs = (quartile_edges(recency), quartile_edges(frequency), quartile_edges(monetary))
+        self._cutoffs_now = self._now
+        self._changed = 0
+        self._refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """
+        Recomputes the quartile cutoffs now.
+        """
+        with self._lock:
+            self._refresh_cutoffs(force=True)
+
+    def score(self, uid: str) -> dict:
+        """
+        RFM aggregates, quartiles, score and segment of one customer.
+
+        Args:
+            uid (str): user id.
+
+        Returns:
+            dict: recency, frequency, monetary_value, r_quartile, f_quartile, m_quartile, RFM_score
+                and customer_segment.
+        """
+        with self._lock:
+            if uid not in self._last_purchase:
+                raise ValueError("uid not found, please input the user's uid to the purchase history dataset first")
+            self._refresh_cutoffs()
+            r_edges, f_edges, m_edges = self._cutoffs
+            last = self._last_purchase[uid]
+            frequency = self._frequency[uid]
+            monetary = self._monetary[uid]
+            recency = (self._now - last).days
+            r_quartile = str(quartile_labels((self._cutoffs_now - last).days, r_edges))
+        f_quartile = str(quartile_labels(frequency, f_edges))
+        m_quartile = str(quartile_labels(monetary, m_edges))
+        rfm_score = r_quartile + f_quartile + m_quartile
+        return {
+            'recency': recency,
+            'frequency': frequency,
+            'monetary_value': monetary,
+            'r_quartile': r_quartile,
+            'f_quartile': f_quartile,
+            'm_quartile': m_quartile,
+            'RFM_score': rfm_score,
+            'customer_segment': SEGMENTS.get(rfm_score, 'Other'),
+        }
+
+    def table(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: the rfmTable of every customer, indexed by uid.
+        """
+        with self._lock:
+            self._refresh_cutoffs()
+            r_edges, f_edges, m_edges = self._cutoffs
+            uids = sorted(self._last_purchase)
+            last = pd.DatetimeIndex([self._last_purchase[uid] for uid in uids])
+            rfm_table = pd.DataFrame({
+                'recency': (self._now - last).days.to_numpy(),
+                'frequency': [self._frequency[uid] for uid in uids],
+                'monetary_value': [self._monetary[uid] for uid in uids],
+            }, index=pd.Index(uids, name='uid'))
+            r_days = (self._cutoffs_now - last).days.to_numpy()
+        rfm_table['r_quartile'] = quartile_labels(r_days, r_edges).astype(str)
+        rfm_table['f_quartile'] = quartile_labels(rfm_table['frequency'].to_numpy(), f_edges).astype(str)
+        rfm_table['m_quartile'] = quartile_labels(rfm_table['monetary_value'].to_numpy(), m_edges).astype(str)
+        rfm_table['RFM_score'] = rfm_table['r_quartile'] + rfm_table['f_quartile'] + rfm_table['m_quartile']
+        rfm_table['customer_segment'] = rfm_table['RFM_score'].map(SEGMENTS).fillna('Other')
+        return rfm_table
+
+    def uids(self) -> list[str]:
+        with self._lock:
+            return list(self._last_purchase)
+
+    def __contains__(self, uid):
+        return uid in self._last_purchase
+
+    def __len__(self):
+        return len(self._last_purchase)
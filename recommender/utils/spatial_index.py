@@ -0,0 +1,197 @@
+import math
+import threading
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from .distance import EARTH_RADIUS_KM, great_circle_km
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+class SpatialIndex:
+    """
+    Fixed-size lat/long grid (geohash-style cells) over the row positions of a purchase_history frame.
+
+    Radius and k-nearest queries only visit the cells around the query point and compute exact
+    great-circle distances for the rows found there, so their cost depends on the density of the
+    neighbourhood rather than on the size of the history. Rows are only ever added, matching the
+    append-only store; rows without coordinates are not indexed. Longitudes do not wrap at +-180.
+    """
+
+    def __init__(self, cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self._lock = threading.Lock()
+        self._cells = defaultdict(list)
+        self._lat = np.empty(0, dtype=np.float64)
+        self._lon = np.empty(0, dtype=np.float64)
+        self._product = np.empty(0, dtype=object)
+        self._size = 0
+        self._bounds = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, cell_deg: float = 0.01):
+        """
+        Builds an index over every row of a purchase_history frame, keyed by row position.
+        """
+        index = cls(cell_deg)
+        index.extend(df, 0)
+        return index
+
+    def _cell(self, lat: float, lon: float):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def _reserve(self, size: int):
+        if size <= len(self._lat):
+            return
+        capacity = max(size, 2 * len(self._lat), 1024)
+        for name in ('_lat', '_lon', '_product'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def extend(self, rows: pd.DataFrame, start: int):
+        """
+        Indexes appended rows.
+
+        Args:
+            rows (pd.DataFrame): rows with long, lat and product_name columns.
+            start (int): row position of the first of `rows` in the full frame.
+        """
+        lats = rows['lat'].to_numpy(dtype=np.float64)
+        lons = rows['long'].to_numpy(dtype=np.float64)
+        products = rows['product_name'].to_numpy(dtype=object)
+        end = start + len(rows)
+        with self._lock:
+            self._reserve(end)
+            self._lat[start:end] = lats
+            self._lon[start:end] = lons
+            self._product[start:end] = products
+            self._size = max(self._size, end)
+            for offset in np.flatnonzero(np.isfinite(lats) & np.isfinite(lons)):
+                cell = self._cell(lats[offset], lons[offset])
+                self._cells[cell].append(start + int(offset))
+                if self._bounds is None:
+                    self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+                else:
+                    self._bounds = [min(self._bounds[0], cell[0]), max(self._bounds[1], cell[0]),
+                                    min(self._bounds[2], cell[1]), max(self._bounds[3], cell[1])]
+
+    def _candidates(self, cells, products):
+        positions = [position for cell in cells for position in self._cells.get(cell, ())]
+        positions = np.asarray(positions, dtype=np.int64)
+        if products is not None and len(positions):
+            positions = positions[np.isin(self._product[positions], list(products))]
+        return positions
+
+    def _ring(self, center, radius: int):
+        row, col = center
+        if radius == 0:
+            return [center]
+        cells = []
+        for d in range(-radius, radius + 1):
+            cells += [(row - radius, col + d), (row + radius, col + d)]
+        for d in range(-radius + 1, radius):
+            cells += [(row + d, col - radius), (row + d, col + radius)]
+        return cells
+
+    def within(self, lat: float, lon: float, max_km: float, products=None):
+        """
+        Rows within `max_km` of a point.
+
+        Args:
+            lat (float): latitude of the point.
+            lon (float): longitude of the point.
+            max_km (float): search radius in kilometers.
+            products (list[str]): only return rows selling one of these product names.
+
+        Returns:
+            tuple(numpy.ndarray, numpy.ndarray): row positions and their distances in kilometers,
+                sorted by distance.
+        """
+        dlat = max_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+        dlon = min(180.0, dlat / max(cos_lat, 1e-6))
+        row_min, col_min = self._cell(lat - dlat, lon - dlon)
+        row_max, col_max = self._cell(lat + dlat, lon + dlon)
+
+        with self._lock:
+            if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._cells):
+                cells = [cell for cell in self._cells
+                         if row_min <= cell[0] <= row_max and col_min <= cell[1] <= col_max]
+            else:
+                cells = [(row, col) for row in range(row_min, row_max + 1)
+                         for col in range(col_min, col_max + 1)]
+            positions = self._candidates(cells, products)
+            distances = great_circle_km(self._lat[positions], self._lon[positions], lat, lon)
+
+        keep = distances <= max_km
+        positions, distances = positions[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return positions[order], distances[order]
+
+    def nearest(self, lat: float, lon: float, k: int, products=None, max_km: float = None):
+        """
+        Rows at the `k` nearest distinct store locations to a point.
+
+        Rings of cells around the point are visited until k locations have been found that are
+        closer than anything in the unvisited rings can be.
+
+        Args:
+            lat (float): latitude of the point.
+            lon (float): longitude of the point.
+            k (int): number of store locations to return.
+            products (list[str]): only consider rows selling one of these product names.
+            max_km (float): optional upper bound on the distance.
+
+        Returns:
+            tuple(numpy.ndarray, numpy.ndarray): row positions and their distances in kilometers,
+                sorted by distance.
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        center = self._cell(lat, lon)
+        with self._lock:
+            if self._bounds is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+            row_min, row_max, col_min, col_max = self._bounds
+            max_radius = max(abs(center[0] - row_min), abs(center[0] - row_max),
+                             abs(center[1] - col_min), abs(center[1] - col_max))
+
+            found = []
+            radius = 0
+            while True:
+                found.append(self._candidates(self._ring(center, radius), products))
+                positions = np.concatenate(found)
+                distances = great_circle_km(self._lat[positions], self._lon[positions], lat, lon)
+                # Anything in an unvisited ring is at least `radius` whole cells away
+                span = math.radians(radius * self.cell_deg)
+                cos_lat = math.cos(math.radians(min(90.0, abs(lat) + (radius + 1) * self.cell_deg)))
+                bound = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_lat * math.sin(span / 2)))
+                if max_km is not None and bound > max_km:
+                    break
+                locations = np.unique(np.column_stack([self._lat[positions], self._lon[positions]]), axis=0)
+                if radius >= max_radius:
+                    break
+                if len(locations) >= k:
+                    location_distances = np.sort(great_circle_km(locations[:, 0], locations[:, 1], lat, lon))
+                    if location_distances[k - 1] <= bound:
+                        break
+                radius += 1
+
+            if max_km is not None:
+                keep = distances <= max_km
+                positions, distances = positions[keep], distances[keep]
+            order = np.argsort(distances, kind='stable')
+            positions, distances = positions[order], distances[order]
+
+            coordinates = np.column_stack([self._lat[positions], self._lon[positions]])
+            _, first_seen = np.unique(coordinates, axis=0, return_index=True)
+            if len(first_seen) > k:
+                cutoff = np.sort(distances[first_seen])[k - 1]
+                keep = distances <= cutoff
+                positions, distances = positions[keep], distances[keep]
+            return positions, distances
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,182 @@
+import threading
+import numpy as np
+import pandas as pd
+from .metrics import timed
+
+
+class UserProfileIndex:
+    """
+    Sparse TF-IDF profiles of each customer's purchased product types, with a top-k similar-customer query.
+
+    Holds the same term counts TfidfVectorizer would build from each uid's joined product_type
+    string, and updates them in place as receipts arrive instead of refitting. A query weighs the
+    counts with the current smoothed idf and computes the cosine similarity of one customer
+    against all others. That is a single sparse matrix-vector product, O(users) in time and
+    memory, instead of the dense users x users similarity matrix.
+    """
+
+    def __init__(self):
+        # scikit-learn (for its tokenizer) and scipy are imported when the first index is built, not
+        # when the store module is
+        import scipy.sparse as sp
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self._analyzer = TfidfVectorizer().build_analyzer()
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._uids = []
+        self._products = []
+        self._vocabulary = {}
+        self._counts = sp.csr_matrix((0, 0), dtype=np.float64)
+        self._pending = {}
+        self._weights = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """
+        Builds the profiles of every uid in a purchase_history frame.
+        """
+        index = cls()
+        index.extend(df, 0)
+        return index
+
+    def extend(self, rows: pd.DataFrame, start: int = 0):
+        """
+        Adds the product types and names of new purchase rows to their customers' profiles.
+
+        Args:
+            rows (pd.DataFrame): rows with uid, product_name and product_type columns.
+            start (int): row position of the first of `rows`, unused but part of the store's derived
+                structure interface.
+        """
+        rows = rows[rows['uid'].notna()]
+        with self._lock:
+            for uid, product_name, product_type in zip(rows['uid'], rows['product_name'], rows['product_type']):
+                row = self._rows.get(uid)
+                if row is None:
+                    row = self._rows[uid] = len(self._uids)
+                    self._uids.append(uid)
+                    self._products.append(set())
+                if isinstance(product_name, str):
+                    self._products[row].add(product_name)
+                if isinstance(product_type, str):
+                    pending = self._pending.setdefault(row, {})
+                    for term in self._analyzer(product_type):
+                        column = self._vocabulary.setdefault(term, len(self._vocabulary))
+                        pending[column] = pending.get(column, 0) + 1
+            self._weights = None
+
+    def _flush(self):
+        import scipy.sparse as sp
+        shape = (len(self._uids), len(self._vocabulary))
+        counts = self._counts
+        if counts.shape != shape:
+            counts.resize(shape)
+        if self._pending:
+            rows, columns, values = [], [], []
+            for row, terms in self._pending.items():
+                for column, count in terms.items():
+                    rows.append(row)
+                    columns.append(column)
+                    values.append(count)
+            counts = counts + sp.csr_matrix((values, (rows, columns)), shape=shape)
+            self._pending = {}
+        self._counts = counts
+
+    def _tfidf(self):
+        if self._weights is None:
+            with timed("tfidf"):
+                self._flush()
+                counts = self._counts
+                n_users = counts.shape[0]
+                document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+                idf = np.log((1 + n_users) / (1 + document_frequency)) + 1
+                weights = counts.multiply(idf).tocsr()
+                norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+                norms[norms == 0] = 1.0
+                self._weights = weights.multiply((1 / norms)[:, np.newaxis]).tocsr()
+        return self._weights
+
+    def similarities(self, uid: str) -> np.ndarray:
+        """
+        Cosine similarity of one customer's profile to every customer's profile.
+
+        Returns:
+            numpy.ndarray: one similarity per customer, in the order of uids().
+        """
+        with self._lock:
+            if uid not in self._rows:
+                raise ValueError("uid not found, please input the user's uid to the purchase history dataset first")
+            weights = self._tfidf()
+            target = weights[self._rows[uid]].toarray().ravel()
+        return weights @ target
+
+    def most_similar(self, uid: str, k: int) -> list[str]:
+        """
+        The `k` customers most similar to `uid`, most similar first, excluding `uid` itself.
+        """
+        similarities = self.similarities(uid)
+        similarities[self._rows[uid]] = -np.inf
+        return [self._uids[row] for row in self._top_k(similarities[np.newaxis, :], k)[0]]
+
+    def _top_k(self, similarities: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, similarities.shape[1] - 1)
+        if k <= 0:
+            return np.empty((similarities.shape[0], 0), dtype=np.int64)
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1)
+
+    def recommend(self, uid: str, num_recommendations: int = 8) -> list[str]:
+        """
+        Products bought by the customers most similar to `uid` that `uid` has not bought yet.
+
+        Returns:
+            list: up to `num_recommendations` product names.
+        """
+        purchases = self.products(uid)
+        recommendations = []
+        for similar_uid in self.most_similar(uid, num_recommendations):
+            recommendations.extend(self.products(similar_uid).difference(purchases))
+        return list(set(recommendations))[:num_recommendations]
+
+    def recommend_batch(self, uids: list[str], num_recommendations: int = 8, chunk_size: int = 256) -> dict:
+        """
+        recommend() for many customers, computing their similarity rows in blocks of `chunk_size`
+        with one sparse matrix product per block.
+
+        Returns:
+            dict: uid -> list of up to `num_recommendations` product names.
+        """
+        with self._lock:
+            missing = [uid for uid in uids if uid not in self._rows]
+            if missing:
+                raise ValueError(f"uid not found in the purchase history: {missing[0]}")
+            weights = self._tfidf()
+            rows = np.array([self._rows[uid] for uid in uids], dtype=np.int64)
+            products = [set(purchases) for purchases in self._products]
+
+        recommendations = {}
+        for begin in range(0, len(rows), chunk_size):
+            block = rows[begin:begin + chunk_size]
+            similarities = (weights[block] @ weights.T).toarray()
+            similarities[np.arange(len(block)), block] = -np.inf
+            for row, neighbours in zip(block, self._top_k(similarities, num_recommendations)):
+                new_items = []
+                for neighbour in neighbours:
+                    new_items.extend(products[neighbour].difference(products[row]))
+                recommendations[self._uids[row]] = list(set(new_items))[:num_recommendations]
+        return recommendations
+
+    def products(self, uid: str) -> set[str]:
+        with self._lock:
+            return set(self._products[self._rows[uid]])
+
+    def uids(self) -> list[str]:
+        with self._lock:
+            return list(self._uids)
+
+    def __contains__(self, uid):
+        return uid in self._rows
+
+    def __len__(self):
+        return len(self._uids)
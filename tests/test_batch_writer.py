@@ -0,0 +1,119 @@
+import os
+import threading
+import pytest
+from Object_Detection.utils.batch_writer import BatchWriter, WriteQueueFull
+from recommender.utils.pipeline import RetryPolicy
+
+
+class FakeRef:
+    def __init__(self, collection, id):
+        self.collection = collection
+        self.id = id
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, document):
+        self.writes.append((ref, document))
+
+    def commit(self):
+        if self.db.failures:
+            self.db.failures -= 1
+            raise RuntimeError("unavailable")
+        self.db.gate.wait()
+        self.db.commits += 1
+        for ref, document in self.writes:
+            self.db.documents[ref.id] = document
+
+
+class FakeCollection:
+    def __init__(self, db):
+        self.db = db
+
+    def document(self):
+        self.db.ids += 1
+        return FakeRef(self, f"doc{self.db.ids}")
+
+
+class FakeDB:
+    def __init__(self, failures=0):
+        self.documents = {}
+        self.commits = 0
+        self.ids = 0
+        self.failures = failures
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def collection(self, name):
+        return FakeCollection(self)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+def test_documents_are_written_in_batches():
+    db = FakeDB()
+    writer = BatchWriter(lambda: db, "records", max_batch=50, max_wait=0.2)
+    ids = [writer.add({"i": i}) for i in range(120)]
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert len(set(ids)) == 120
+    assert sorted(document["i"] for document in db.documents.values()) == list(range(120))
+    assert db.commits <= 5
+
+
+def test_failed_commits_are_retried():
+    db = FakeDB(failures=2)
+    writer = BatchWriter(lambda: db, "records", max_wait=0.05,
+                         retry=RetryPolicy(attempts=3, retry_on=(Exception,), backoff=0.01))
+    writer.add({"i": 0})
+    writer.close()
+    assert writer.written == 1 and writer.failed == 0
+    assert len(db.documents) == 1
+
+
+def test_full_queue_raises():
+    db = FakeDB()
+    db.gate.clear()
+    writer = BatchWriter(lambda: db, "records", max_batch=1, max_wait=0, max_pending=2, put_timeout=0.05)
+    with pytest.raises(WriteQueueFull):
+        for i in range(10):
+            writer.add({"i": i})
+    db.gate.set()
+    writer.close()
+
+
+def test_close_without_writes():
+    BatchWriter(lambda: FakeDB(), "records").close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_writes_after_fork():
+    # like gunicorn's preload_app: the writer is created (and used) in the parent, then forked
+    db = FakeDB()
+    writer = BatchWriter(lambda: db, "records", max_wait=0.05)
+    writer.add({"from": "parent"})
+    assert writer.flush(timeout=5)
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            writer.add({"from": "child"})
+            flushed = writer.flush(timeout=5)
+            writer.close()
+            ok = flushed and writer.written == 1 and {"from": "child"} in db.documents.values()
+            status = 0 if ok else 1
+        finally:
+            os.write(write_end, bytes([status]))
+            os._exit(0)
+    os.close(write_end)
+    status = os.read(read_end, 1)
+    os.waitpid(pid, 0)
+    os.close(read_end)
+    assert status == b"\x00"
+    writer.close()
@@ -0,0 +1,9 @@
+import sys
+import subprocess
+
+
+def test_store_import_does_not_load_scipy_or_sklearn():
+    code = ("import sys; from recommender.utils import PurchaseHistoryStore, recommend, cheap_proximity_rec; "
+            "print(sorted(m for m in ('scipy', 'sklearn') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
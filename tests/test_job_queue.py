@@ -0,0 +1,73 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from recommender.utils.job_queue import JobStore, JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+
+def dead_process_token() -> str:
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return str(pid)
+
+
+def set_job(store, job_id, **columns):
+    with closing(sqlite3.connect(store.path)) as connection, connection:
+        for column, value in columns.items():
+            connection.execute(f"UPDATE jobs SET {column} = ? WHERE id = ?", (value, job_id))
+
+
+def test_jobs_of_an_exited_process_are_failed(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    orphan = store.create("u")
+    store.start(orphan)
+    set_job(store, orphan, owner=dead_process_token())
+    alive = store.create("u")
+
+    assert store.fail_stale() == 1
+    assert store.get(orphan)["status"] == FAILED
+    assert "exited" in store.get(orphan)["error"]
+    assert store.get(alive)["status"] == QUEUED
+
+
+def test_old_jobs_are_failed(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    old = store.create("u")
+    set_job(store, old, created_at=time.time() - 7200)
+    store.create("u")
+
+    assert store.fail_stale(max_age=3600) == 1
+    assert store.get(old)["status"] == FAILED
+
+
+def test_queue_sweeps_on_startup(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    orphan = store.create("u")
+    set_job(store, orphan, status=RUNNING, owner=dead_process_token())
+
+    queue = JobQueue(store, max_workers=1)
+    try:
+        assert store.get(orphan)["status"] == FAILED
+        done = threading.Event()
+        job_id = queue.submit("u", lambda: done.set() or 42)
+        assert done.wait(5)
+        queue.shutdown()
+        assert store.get(job_id, with_result=True)["result"] == 42
+        assert store.get(job_id)["status"] == DONE
+    finally:
+        queue.shutdown()
+
+
+def test_old_table_gains_the_owner_column(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    with closing(sqlite3.connect(path)) as connection, connection:
+        connection.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, uid TEXT, status TEXT NOT NULL, "
+                           "created_at REAL NOT NULL, started_at REAL, finished_at REAL, result TEXT, error TEXT)")
+        connection.execute("INSERT INTO jobs (id, uid, status, created_at) VALUES ('old', 'u', ?, ?)",
+                           (RUNNING, time.time()))
+    store = JobStore(path)
+    assert store.fail_stale() == 1
+    assert store.get("old")["status"] == FAILED
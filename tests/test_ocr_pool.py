@@ -0,0 +1,76 @@
+import time
+import threading
+import pytest
+from Object_Detection.utils.ocr_pool import OCRPool, OCRPoolBusy
+
+
+class SlowPool(OCRPool):
+    """
+    OCRPool whose recognition sleeps for `delay` seconds, or until `gate` is set.
+    """
+
+    def __init__(self, delay: float = 0.0, gate: threading.Event = None, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.gate = gate
+        self.started = 0
+
+    def _image_to_string(self, image) -> str:
+        self.started += 1
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        return f"text {image}"
+
+
+def test_run_returns_text():
+    pool = SlowPool(max_workers=2)
+    try:
+        assert pool.run(1) == "text 1"
+        assert pool.pending() == 0
+    finally:
+        pool.shutdown()
+
+
+def test_run_cancels_a_job_that_never_started():
+    gate = threading.Event()
+    pool = SlowPool(max_workers=1, gate=gate, timeout=0.1, queue_timeout=0.1)
+    try:
+        blocker = pool.submit(0)
+        with pytest.raises(TimeoutError):
+            pool.run(1)
+        gate.set()
+        blocker.result(timeout=5)
+        assert pool.started == 1
+        assert pool.pending() == 0
+    finally:
+        pool.shutdown()
+
+
+def test_job_that_waited_too_long_is_not_run():
+    gate = threading.Event()
+    pool = SlowPool(max_workers=1, gate=gate, timeout=5, queue_timeout=0.05)
+    try:
+        blocker = pool.submit(0)
+        queued = pool.submit(1)
+        time.sleep(0.1)
+        gate.set()
+        blocker.result(timeout=5)
+        with pytest.raises(OCRPoolBusy):
+            queued.result(timeout=5)
+        assert pool.started == 1
+    finally:
+        pool.shutdown()
+
+
+def test_full_queue_raises_busy():
+    gate = threading.Event()
+    pool = SlowPool(max_workers=1, max_pending=1, gate=gate, submit_timeout=0.05)
+    try:
+        blocker = pool.submit(0)
+        with pytest.raises(OCRPoolBusy):
+            pool.submit(1)
+        gate.set()
+        blocker.result(timeout=5)
+    finally:
+        pool.shutdown()
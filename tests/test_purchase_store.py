@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from recommender.utils.purchase_store import COLUMNS, PurchaseHistoryStore
+
+
+def row(uid="u" * 20, date="2024-12-01"):
+    return {'uid': [uid], 'email': ["a@gmail.com"], 'age': [30], 'product_name': ["TEH"],
+            'product_type': ["minuman manis"], 'quantity': [1], 'purchase_price': [5000],
+            'purchase_date': [date], 'purchase_address': ["JL. PEMUDA"], 'long': [110.4], 'lat': [-7.0]}
+
+
+@pytest.fixture(params=["csv", "log"])
+def store(request, tmp_path):
+    path = tmp_path / "purchase_history.csv"
+    pd.DataFrame(row(), columns=COLUMNS).to_csv(path, index=False)
+    log_dir = str(tmp_path / "log") if request.param == "log" else None
+    return PurchaseHistoryStore(str(path), log_dir=log_dir)
+
+
+class Broken:
+    builds = 0
+
+    @classmethod
+    def from_frame(cls, df):
+        cls.builds += 1
+        return cls()
+
+    def extend(self, rows, start):
+        raise RuntimeError("extend failed")
+
+
+def test_dates_are_normalized(store):
+    appended = store.append(row(date="2024-12-02T08:15:00"))
+    assert appended['purchase_date'].tolist() == ["2024-12-02"]
+    assert store.rfm().score("u" * 20)["frequency"] == 2
+
+
+def test_invalid_date_is_rejected_before_persisting(store):
+    with pytest.raises(ValueError):
+        store.append(row(date="02/12/2024"))
+    assert len(store) == 1
+    store.load()
+    assert len(store) == 1
+
+
+def test_failed_extend_rebuilds_derived_structures(store):
+    Broken.builds = 0
+    rfm = store.rfm()
+    store.derived("broken", Broken.from_frame)
+    store.append(row(uid="v" * 20))
+    assert len(store) == 2
+    # every structure is rebuilt from the full frame, not only the one that failed
+    assert store.rfm() is not rfm
+    assert store.rfm().score("v" * 20)["frequency"] == 1
+    store.derived("broken", Broken.from_frame)
+    assert Broken.builds == 2
@@ -0,0 +1,105 @@
+import os
+import pandas as pd
+import pytest
+from recommender.utils.purchase_store import COLUMNS, PurchaseHistoryStore
+from recommender.utils.receipt_log import ReceiptLog
+
+
+def rows(*uids):
+    return pd.DataFrame({'uid': list(uids), 'email': "a@gmail.com", 'age': 30.0, 'product_name': "TEH",
+                         'product_type': "minuman manis", 'quantity': 1, 'purchase_price': 5000.0,
+                         'purchase_date': "2024-12-01", 'purchase_address': "TOKO 1\nJL. PEMUDA",
+                         'long': 110.4, 'lat': -7.0}, columns=COLUMNS)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    dataset = str(tmp_path / "purchase_history.csv")
+    rows("a", "b").to_csv(dataset, index=False)
+    return dataset, str(tmp_path / "log")
+
+
+class CountingStore(PurchaseHistoryStore):
+    loads = 0
+
+    def load(self):
+        self.loads += 1
+        return super().load()
+
+
+def test_compaction_does_not_reload_readers(paths):
+    dataset, log_dir = paths
+    reader = CountingStore(dataset, log_dir=log_dir)
+    writer = PurchaseHistoryStore(dataset, log_dir=log_dir)
+    reader.frame()
+    writer.append(rows("c"))
+    reader.frame()
+    writer.append(rows("d"))
+    # "d" was folded into the base before the reader saw it
+    assert writer.log.compact() == 1
+    writer.append(rows("e"))
+
+    assert reader.frame()['uid'].tolist() == ["a", "b", "c", "d", "e"]
+    assert reader.loads == 1
+    assert writer.frame()['uid'].tolist() == ["a", "b", "c", "d", "e"]
+
+
+def test_cursor_survives_several_compactions(paths):
+    dataset, log_dir = paths
+    reader = CountingStore(dataset, log_dir=log_dir)
+    log = ReceiptLog(log_dir, dataset, segment_bytes=1)
+    reader.frame()
+    for uid in "cdef":
+        log.append(rows(uid))
+        log.compact()
+    log.append(rows("g"))
+
+    assert reader.frame()['uid'].tolist() == list("abcdefg")
+    assert reader.loads == 1
+
+
+def interrupt(monkeypatch, step: str):
+    """
+    Makes the next compaction die right before `step` ("swap" or "commit").
+    """
+    if step == "swap":
+        real_replace = os.replace
+
+        def replace(src, dst):
+            if src.endswith(".compacting"):
+                raise KeyboardInterrupt
+            return real_replace(src, dst)
+        monkeypatch.setattr("recommender.utils.receipt_log.os.replace", replace)
+    else:
+        real_write = ReceiptLog._write_manifest
+
+        def write_manifest(self, state):
+            if "next" not in state:
+                raise KeyboardInterrupt
+            return real_write(self, state)
+        monkeypatch.setattr(ReceiptLog, "_write_manifest", write_manifest)
+
+
+@pytest.mark.parametrize("step", ["swap", "commit"])
+def test_interrupted_compaction_keeps_every_row_once(paths, monkeypatch, step):
+    dataset, log_dir = paths
+    reader = CountingStore(dataset, log_dir=log_dir)
+    reader.frame()
+    log = ReceiptLog(log_dir, dataset)
+    log.append(rows("c", "d"))
+    with monkeypatch.context() as patch:
+        interrupt(patch, step)
+        with pytest.raises(KeyboardInterrupt):
+            log.compact()
+
+    # a restarted process, and one that was running all along
+    assert ReceiptLog(log_dir, dataset).read_all()[0]['uid'].tolist() == ["a", "b", "c", "d"]
+    assert reader.frame()['uid'].tolist() == ["a", "b", "c", "d"]
+
+    log.append(rows("e"))
+    assert reader.frame()['uid'].tolist() == ["a", "b", "c", "d", "e"]
+    log.compact()
+    log.append(rows("f"))
+    assert ReceiptLog(log_dir, dataset).read_all()[0]['uid'].tolist() == ["a", "b", "c", "d", "e", "f"]
+    assert pd.read_csv(dataset)['uid'].tolist() == ["a", "b", "c", "d", "e"]
+    assert reader.frame()['uid'].tolist() == ["a", "b", "c", "d", "e", "f"]
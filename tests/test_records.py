@@ -0,0 +1,76 @@
+import json
+import pytest
+from Object_Detection.utils.records import read_page, stream_records
+
+
+class FakeDocument:
+    def __init__(self, id, data):
+        self.id = id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """
+    In-memory stand-in for a Firestore query ordered by document id. stream() raises after
+    `fail_after` documents when it is set.
+    """
+
+    def __init__(self, documents, after=None, limit=None, fail_after=None):
+        self.documents = documents
+        self.after = after
+        self._limit = limit
+        self.fail_after = fail_after
+
+    def start_after(self, values):
+        return FakeQuery(self.documents, values["__name__"], self._limit, self.fail_after)
+
+    def limit(self, count):
+        return FakeQuery(self.documents, self.after, count, self.fail_after)
+
+    def stream(self):
+        ids = sorted(id for id in self.documents if self.after is None or id > self.after)
+        for index, id in enumerate(ids[:self._limit]):
+            if index == self.fail_after:
+                raise RuntimeError("deadline exceeded")
+            yield FakeDocument(id, self.documents[id])
+
+
+def records(count):
+    return {f"r{i:03d}": {"filename": f"{i}.jpg"} for i in range(count)}
+
+
+def test_without_limit_returns_every_record():
+    result, next_cursor = read_page(FakeQuery(records(120)))
+    assert len(result) == 120
+    assert result[0] == {"id": "r000", "filename": "0.jpg"}
+    assert next_cursor is None
+
+
+def test_pages_follow_the_cursor():
+    query = FakeQuery(records(5))
+    page, cursor = read_page(query, limit=2)
+    assert [r["id"] for r in page] == ["r000", "r001"] and cursor == "r001"
+    page, cursor = read_page(query, limit=2, start_after=cursor)
+    assert [r["id"] for r in page] == ["r002", "r003"] and cursor == "r003"
+    page, cursor = read_page(query, limit=2, start_after=cursor)
+    assert [r["id"] for r in page] == ["r004"] and cursor is None
+
+
+def test_stream_is_one_json_array():
+    assert json.loads("".join(stream_records(FakeQuery(records(3))))) == [
+        {"id": "r000", "filename": "0.jpg"}, {"id": "r001", "filename": "1.jpg"}, {"id": "r002", "filename": "2.jpg"}]
+    assert json.loads("".join(stream_records(FakeQuery({})))) == []
+
+
+def test_stream_failing_before_the_first_record_raises():
+    with pytest.raises(RuntimeError):
+        stream_records(FakeQuery(records(3), fail_after=0))
+
+
+def test_stream_failing_midway_ends_with_an_error():
+    body = json.loads("".join(stream_records(FakeQuery(records(3), fail_after=2))))
+    assert [r.get("id") for r in body[:2]] == ["r000", "r001"]
+    assert "deadline exceeded" in body[-1]["error"]
@@ -0,0 +1,57 @@
+import pandas as pd
+from Object_Detection.utils.result_cache import ResultCache
+from Object_Detection.utils.geocoding import Gazetteer
+
+
+class CountingCache(ResultCache):
+    connections = 0
+
+    def _connect(self):
+        CountingCache.connections += 1
+        return super()._connect()
+
+
+def test_put_many_is_one_transaction(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = CountingCache(path=path)
+    CountingCache.connections = 0
+    cache.put_many({f"k{i}": i for i in range(1000)})
+    assert CountingCache.connections == 1
+    assert cache.get("k999") == 999
+
+    # a second process sees the entries in the file
+    assert ResultCache(path=path).get("k10") == 10
+
+
+def test_put_many_expires(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.db"))
+    cache.put_many([("a", 1), ("b", 2)], ttl=-1)
+    assert cache.get("a") is None
+    assert ResultCache(path=cache.path).get("b") is None
+
+
+def test_gazetteer_seeds_in_one_transaction(tmp_path, monkeypatch):
+    monkeypatch.setattr("Object_Detection.utils.geocoding.ResultCache", CountingCache)
+    df = pd.DataFrame({
+        'purchase_address': [f"TOKO {i}\nJL. PEMUDA NO.{i}" for i in range(500)] * 2,
+        'long': [110.4] * 1000,
+        'lat': [-7.0] * 1000,
+    })
+    CountingCache.connections = 0
+    gazetteer = Gazetteer.from_frame(df, path=str(tmp_path / "geocode.db"))
+    # one to create the table, one for the seed
+    assert CountingCache.connections == 2
+    assert len(gazetteer) == 500
+    assert gazetteer.lookup("Toko 3, Jl. Pemuda No. 3") == (-7.0, 110.4)
+
+
+def test_known_address_needs_no_credentials():
+    def credentials():
+        raise AssertionError("credentials resolved for a known address")
+
+    df = pd.DataFrame({'purchase_address': ["TOKO 1\nJL. PEMUDA"], 'long': [110.4], 'lat': [-7.0]})
+    calls = []
+    gazetteer = Gazetteer.from_frame(df, geocode=lambda address, credentials: calls.append(address) or (1.0, 2.0))
+    assert gazetteer.geocode("Toko 1, Jl. Pemuda", credentials) == (-7.0, 110.4)
+    assert gazetteer.geocode("TOKO 2", credentials) == (1.0, 2.0)
+    assert calls == ["TOKO 2"]